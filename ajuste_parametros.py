@@ -0,0 +1,237 @@
+# ajuste_parametros.py (AJUSTE OFFLINE DE ATAQUE/DEFESA/MANDO POR MÁXIMA VEROSSIMILHANÇA)
+"""Ajusta ratings de ataque, defesa e vantagem de mando (Poisson + correção Dixon–Coles) a partir
+de um CSV de resultados e grava um arquivo .npy compacto com um .json de metadados ao lado.
+
+Uso: python ajuste_parametros.py historico.csv [--saida parametros_equipes.npy] [--meia-vida 180]
+"""
+import argparse
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# =============================================
+# 📁 FORMATO DOS ARQUIVOS
+# =============================================
+
+CAMINHO_PARAMETROS = Path(__file__).with_name('parametros_equipes.npy')
+COLUNAS_OBRIGATORIAS = ('mandante', 'visitante', 'gols_mandante', 'gols_visitante')
+COLUNA_DATA = 'data'
+VERSAO_FORMATO = 1
+
+# Vetor gravado: [mu, casa, rho, ataque_1..ataque_n, defesa_1..defesa_n]
+POSICAO_MU, POSICAO_CASA, POSICAO_RHO, INICIO_EQUIPES = 0, 1, 2, 3
+
+# Penalidade L2 nos ratings - fixa a identificabilidade (ataque e defesa centrados em zero)
+REGULARIZACAO = 1e-3
+LIMITES_RHO = (-0.3, 0.3)
+
+def caminho_metadados(caminho: Path) -> Path:
+    """Arquivo .json de metadados ao lado do .npy"""
+    return Path(caminho).with_suffix('.json')
+
+# =============================================
+# 📂 PARÂMETROS AJUSTADOS (LEITURA SOB DEMANDA)
+# =============================================
+
+@dataclass(frozen=True)
+class ParametrosEquipes:
+    equipes: Tuple[str, ...]
+    valores: np.ndarray
+    metadados: Dict
+
+    @classmethod
+    def carregar(cls, caminho: Path = CAMINHO_PARAMETROS) -> 'ParametrosEquipes':
+        """Lê o .npy com memory-map (nada é copiado até ser usado) e o .json de metadados"""
+        with open(caminho_metadados(caminho), encoding='utf-8') as arquivo:
+            metadados = json.load(arquivo)
+        return cls(tuple(metadados['equipes']), np.load(caminho, mmap_mode='r'), metadados)
+
+    @property
+    def indice(self) -> Dict[str, int]:
+        return {equipe: i for i, equipe in enumerate(self.equipes)}
+
+    @property
+    def rho(self) -> float:
+        return float(self.valores[POSICAO_RHO])
+
+    def ataque(self, equipe: str) -> float:
+        return float(self.valores[INICIO_EQUIPES + self.indice[equipe]])
+
+    def defesa(self, equipe: str) -> float:
+        return float(self.valores[INICIO_EQUIPES + len(self.equipes) + self.indice[equipe]])
+
+    def lambdas(self, favorito: str, azarao: str, favorito_mandante: Optional[bool] = True) -> Tuple[float, float]:
+        """Gols esperados (favorito, azarão); favorito_mandante=None para campo neutro"""
+        mu, casa = float(self.valores[POSICAO_MU]), float(self.valores[POSICAO_CASA])
+        casa_fav = casa if favorito_mandante else 0.0
+        casa_aza = casa if favorito_mandante is False else 0.0
+        lambda_fav = np.exp(mu + casa_fav + self.ataque(favorito) + self.defesa(azarao))
+        lambda_aza = np.exp(mu + casa_aza + self.ataque(azarao) + self.defesa(favorito))
+        return float(lambda_fav), float(lambda_aza)
+
+@lru_cache(maxsize=4)
+def _carregar_em_cache(caminho: str, modificado_em: float) -> ParametrosEquipes:
+    return ParametrosEquipes.carregar(Path(caminho))
+
+def carregar_parametros(caminho: Path = CAMINHO_PARAMETROS) -> Optional[ParametrosEquipes]:
+    """Parâmetros do último ajuste, reaproveitados entre reruns até o arquivo mudar; None se não houver ajuste"""
+    caminho = Path(caminho)
+    if not caminho.exists() or not caminho_metadados(caminho).exists():
+        return None
+    return _carregar_em_cache(str(caminho.resolve()), caminho.stat().st_mtime)
+
+# =============================================
+# 📈 VEROSSIMILHANÇA E AJUSTE
+# =============================================
+
+def ler_historico(caminho_csv: Path) -> pd.DataFrame:
+    """CSV de resultados: mandante, visitante, gols_mandante, gols_visitante e, opcionalmente, data"""
+    historico = pd.read_csv(caminho_csv)
+    faltantes = [coluna for coluna in COLUNAS_OBRIGATORIAS if coluna not in historico.columns]
+    if faltantes:
+        raise ValueError(f"Colunas ausentes no histórico: {', '.join(faltantes)}")
+    historico = historico.dropna(subset=list(COLUNAS_OBRIGATORIAS))
+    if COLUNA_DATA in historico.columns:
+        historico[COLUNA_DATA] = pd.to_datetime(historico[COLUNA_DATA])
+    return historico
+
+def pesos_temporais(historico: pd.DataFrame, meia_vida_dias: Optional[float]) -> np.ndarray:
+    """Peso exponencial por idade do jogo (jogos recentes valem mais); 1 para todos sem data ou meia-vida"""
+    if not meia_vida_dias or COLUNA_DATA not in historico.columns:
+        return np.ones(len(historico))
+    idade = (historico[COLUNA_DATA].max() - historico[COLUNA_DATA]).dt.days.to_numpy(dtype=float)
+    return 0.5 ** (idade / meia_vida_dias)
+
+def _lambdas_jogos(theta: np.ndarray, mandantes: np.ndarray, visitantes: np.ndarray,
+                   n_equipes: int) -> Tuple[np.ndarray, np.ndarray]:
+    mu, casa = theta[0], theta[1]
+    ataque, defesa = theta[2:2 + n_equipes], theta[2 + n_equipes:]
+    lambda_mandante = np.exp(mu + casa + ataque[mandantes] + defesa[visitantes])
+    lambda_visitante = np.exp(mu + ataque[visitantes] + defesa[mandantes])
+    return lambda_mandante, lambda_visitante
+
+def _verossimilhanca_poisson(theta: np.ndarray, mandantes: np.ndarray, visitantes: np.ndarray,
+                             gols_mandante: np.ndarray, gols_visitante: np.ndarray,
+                             pesos: np.ndarray, n_equipes: int) -> Tuple[float, np.ndarray]:
+    """−log L ponderada (sem constantes) e gradiente analítico - θ = [mu, casa, ataques, defesas]"""
+    lambda_mandante, lambda_visitante = _lambdas_jogos(theta, mandantes, visitantes, n_equipes)
+    ratings = theta[2:]
+    valor = np.sum(pesos * (lambda_mandante - gols_mandante * np.log(lambda_mandante)
+                            + lambda_visitante - gols_visitante * np.log(lambda_visitante)))
+    valor += REGULARIZACAO * ratings @ ratings
+
+    residuo_mandante = pesos * (lambda_mandante - gols_mandante)
+    residuo_visitante = pesos * (lambda_visitante - gols_visitante)
+    gradiente = np.empty_like(theta)
+    gradiente[0] = residuo_mandante.sum() + residuo_visitante.sum()
+    gradiente[1] = residuo_mandante.sum()
+    gradiente[2:2 + n_equipes] = (np.bincount(mandantes, residuo_mandante, n_equipes)
+                                  + np.bincount(visitantes, residuo_visitante, n_equipes))
+    gradiente[2 + n_equipes:] = (np.bincount(visitantes, residuo_mandante, n_equipes)
+                                 + np.bincount(mandantes, residuo_visitante, n_equipes))
+    gradiente[2:] += 2 * REGULARIZACAO * ratings
+    return valor, gradiente
+
+def _verossimilhanca_rho(rho: float, lambda_mandante: np.ndarray, lambda_visitante: np.ndarray,
+                         gols_mandante: np.ndarray, gols_visitante: np.ndarray, pesos: np.ndarray) -> float:
+    """−log τ ponderado da correção Dixon–Coles nos placares baixos"""
+    tau = np.ones_like(lambda_mandante)
+    tau = np.where((gols_mandante == 0) & (gols_visitante == 0), 1 - lambda_mandante * lambda_visitante * rho, tau)
+    tau = np.where((gols_mandante == 0) & (gols_visitante == 1), 1 + lambda_mandante * rho, tau)
+    tau = np.where((gols_mandante == 1) & (gols_visitante == 0), 1 + lambda_visitante * rho, tau)
+    tau = np.where((gols_mandante == 1) & (gols_visitante == 1), 1 - rho, tau)
+    return -np.sum(pesos * np.log(np.maximum(tau, 1e-12)))
+
+def ponto_inicial(equipes: List[str], anterior: Optional[ParametrosEquipes]) -> np.ndarray:
+    """θ inicial - aquecido pelo último ajuste (equipes novas começam na média), ou zeros"""
+    n_equipes = len(equipes)
+    theta = np.zeros(2 + 2 * n_equipes)
+    theta[0] = np.log(1.3)
+    if anterior is None:
+        return theta
+
+    theta[0] = anterior.valores[POSICAO_MU]
+    theta[1] = anterior.valores[POSICAO_CASA]
+    indice_anterior = anterior.indice
+    for i, equipe in enumerate(equipes):
+        if equipe in indice_anterior:
+            theta[2 + i] = anterior.ataque(equipe)
+            theta[2 + n_equipes + i] = anterior.defesa(equipe)
+    return theta
+
+def ajustar_parametros(historico: pd.DataFrame, meia_vida_dias: Optional[float] = None,
+                       anterior: Optional[ParametrosEquipes] = None) -> Tuple[np.ndarray, Dict]:
+    """Máxima verossimilhança (L-BFGS-B com gradiente analítico) dos ratings e, em seguida, do rho de Dixon–Coles"""
+    from scipy.optimize import minimize, minimize_scalar
+
+    equipes = sorted(set(historico['mandante']) | set(historico['visitante']))
+    indice = {equipe: i for i, equipe in enumerate(equipes)}
+    n_equipes = len(equipes)
+    mandantes = historico['mandante'].map(indice).to_numpy()
+    visitantes = historico['visitante'].map(indice).to_numpy()
+    gols_mandante = historico['gols_mandante'].to_numpy(dtype=float)
+    gols_visitante = historico['gols_visitante'].to_numpy(dtype=float)
+    pesos = pesos_temporais(historico, meia_vida_dias)
+    argumentos = (mandantes, visitantes, gols_mandante, gols_visitante, pesos, n_equipes)
+
+    resultado = minimize(_verossimilhanca_poisson, ponto_inicial(equipes, anterior), args=argumentos,
+                         jac=True, method='L-BFGS-B')
+    theta = resultado.x
+
+    lambda_mandante, lambda_visitante = _lambdas_jogos(theta, mandantes, visitantes, n_equipes)
+    ajuste_rho = minimize_scalar(_verossimilhanca_rho, bounds=LIMITES_RHO, method='bounded',
+                                 args=(lambda_mandante, lambda_visitante, gols_mandante, gols_visitante, pesos))
+
+    valores = np.concatenate(([theta[0], theta[1], ajuste_rho.x], theta[2:]))
+    metadados = {
+        'versao': VERSAO_FORMATO,
+        'equipes': equipes,
+        'layout': ['mu', 'casa', 'rho', 'ataque[equipes]', 'defesa[equipes]'],
+        'jogos': int(len(historico)),
+        'meia_vida_dias': meia_vida_dias,
+        'aquecido': anterior is not None,
+        'iteracoes': int(resultado.nit),
+        'convergiu': bool(resultado.success),
+        'log_verossimilhanca': float(-(resultado.fun + ajuste_rho.fun)),
+        'ajustado_em': datetime.now().isoformat(timespec='seconds'),
+    }
+    return valores, metadados
+
+def salvar_parametros(valores: np.ndarray, metadados: Dict, caminho: Path = CAMINHO_PARAMETROS):
+    """Grava o .npy (float64 contíguo, pronto para memory-map) e o .json de metadados"""
+    caminho = Path(caminho)
+    np.save(caminho, np.ascontiguousarray(valores, dtype=np.float64))
+    with open(caminho_metadados(caminho), 'w', encoding='utf-8') as arquivo:
+        json.dump(metadados, arquivo, ensure_ascii=False, indent=2)
+
+# =============================================
+# 🚀 LINHA DE COMANDO
+# =============================================
+
+def main(argumentos: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Ajusta ratings de ataque/defesa/mando a partir de um CSV de resultados")
+    parser.add_argument('historico', type=Path, help="CSV com mandante, visitante, gols_mandante, gols_visitante[, data]")
+    parser.add_argument('--saida', type=Path, default=CAMINHO_PARAMETROS, help="Arquivo .npy de parâmetros")
+    parser.add_argument('--meia-vida', type=float, default=None, help="Meia-vida em dias do peso temporal dos jogos")
+    parser.add_argument('--sem-aquecimento', action='store_true', help="Ignora o último ajuste e parte do zero")
+    opcoes = parser.parse_args(argumentos)
+
+    anterior = None
+    if not opcoes.sem_aquecimento and opcoes.saida.exists() and caminho_metadados(opcoes.saida).exists():
+        # Cópia em memória: o arquivo será sobrescrito
+        anterior = ParametrosEquipes.carregar(opcoes.saida)
+        anterior = ParametrosEquipes(anterior.equipes, np.array(anterior.valores), anterior.metadados)
+
+    valores, metadados = ajustar_parametros(ler_historico(opcoes.historico), opcoes.meia_vida, anterior)
+    salvar_parametros(valores, metadados, opcoes.saida)
+    print(f"{len(metadados['equipes'])} equipes, {metadados['jogos']} jogos, {metadados['iteracoes']} iterações "
+          f"({'aquecido' if metadados['aquecido'] else 'do zero'}) → {opcoes.saida}")
+
+if __name__ == "__main__":
+    main()
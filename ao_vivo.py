@@ -5,12 +5,18 @@ import plotly.express as px
 import numpy as np
 from enum import Enum
 from dataclasses import dataclass
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Optional
+from functools import lru_cache
+from collections import OrderedDict
+import hashlib
+import copy
 import json
 import sys
 import os
 from datetime import datetime
 
+from ajuste_parametros import carregar_parametros
+
 # =============================================
 # 🎯 ENUMS E ESTRUTURAS BÁSICAS
 # =============================================
@@ -29,19 +35,403 @@ class BetType(Enum):
     UNDER_25_DC_1X = "Menos 2.5 & Dupla Chance 1X"
     OVER_25_DC_12 = "Mais 2.5 & Dupla Chance 12"
 
-@dataclass
-class Bet:
-    bet_type: BetType
-    investment: float
-    odds: float
+BET_TYPE_POR_NOME = {bet_type.value: bet_type for bet_type in BetType}
 
-    @property
-    def potential_return(self) -> float:
-        return self.investment * self.odds
+# =============================================
+# 🗂️ REGISTRO DECLARATIVO DE MERCADOS
+# =============================================
 
-    @property
-    def implied_probability(self) -> float:
-        return (1 / self.odds) * 100 if self.odds > 0 else 0
+# Grade padrão de placares avaliada de uma vez (0..N gols por equipe)
+MAX_GOLS_GRADE = 6
+
+# Resíduo de ponto flutuante das atualizações incrementais tratado como equilíbrio
+TOLERANCIA_EQUILIBRIO = 1e-9
+
+# Odd de equilíbrio mínima - o cenário fica coberto a qualquer odd (nenhuma odd real fica abaixo de 1.0)
+ODD_EQUILIBRIO_COBERTO = 1.0
+
+def formatar_odd_equilibrio(odd: float) -> str:
+    """Odd de equilíbrio legível: '—' sem efeito, 'qualquer odd' quando o cenário já está coberto"""
+    if np.isnan(odd):
+        return "—"
+    return "qualquer odd" if odd <= ODD_EQUILIBRIO_COBERTO else f"{odd:.2f}"
+
+# Eixo do primeiro gol: 0 = não informado, 1 = favorito marcou primeiro, 2 = azarão marcou primeiro
+PRIMEIRO_GOL_INDICE = {None: 0, True: 1, False: 2}
+
+# Redução dos primeiros gols possíveis de um placar (NaN marca os impossíveis)
+REDUCOES_PRIMEIRO_GOL = {'min': np.nanmin, 'max': np.nanmax, 'mean': np.nanmean}
+
+def grade_cenarios(max_gols: int = MAX_GOLS_GRADE) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Grades (casa, fora, primeiro gol) de todos os cenários, com o primeiro gol como eixo mais interno"""
+    return np.meshgrid(np.arange(max_gols + 1), np.arange(max_gols + 1),
+                       np.arange(len(PRIMEIRO_GOL_INDICE)), indexing='ij')
+
+def mascara_cenarios_reais(max_gols: int = MAX_GOLS_GRADE) -> np.ndarray:
+    """Cenários possíveis com o primeiro gol definido (0x0 sem primeiro gol) - vetor achatado"""
+    h, a, p = grade_cenarios(max_gols)
+    return ((((h + a) == 0) & (p == PRIMEIRO_GOL_INDICE[None]))
+            | ((p == PRIMEIRO_GOL_INDICE[True]) & (h > 0))
+            | ((p == PRIMEIRO_GOL_INDICE[False]) & (a > 0))).ravel()
+
+def rotulo_cenario(indice: int, max_gols: int = MAX_GOLS_GRADE) -> str:
+    """Descrição legível de um cenário da matriz achatada, ex.: '2x1 (FAV 1º)'"""
+    placar, primeiro = divmod(int(indice), len(PRIMEIRO_GOL_INDICE))
+    h, a = divmod(placar, max_gols + 1)
+    return f"{h}x{a}" + {1: " (FAV 1º)", 2: " (AZA 1º)"}.get(primeiro, "")
+
+def indice_cenario(home_goals, away_goals, first_goal_by_fav=None, max_gols: int = MAX_GOLS_GRADE):
+    """Posição do cenário na matriz achatada de payoff"""
+    return (np.asarray(home_goals) * (max_gols + 1) + np.asarray(away_goals)) * len(PRIMEIRO_GOL_INDICE) \
+        + PRIMEIRO_GOL_INDICE[first_goal_by_fav]
+
+@dataclass(frozen=True)
+class MercadoSpec:
+    """Mercado declarado uma única vez: liquidação, probabilidade e exibição"""
+    codigo: str
+    nome: str
+    # Predicado vetorizado - recebe grades (gols casa, gols fora, primeiro gol)
+    liquidacao: Callable[[np.ndarray, np.ndarray, np.ndarray], np.ndarray]
+    chave_probabilidade: Optional[str] = None
+    grupo: str = "Principal"
+    # Fração da stake devolvida (linhas inteiras/quartas); None = mercado sem reembolso
+    reembolso: Optional[Callable[[np.ndarray, np.ndarray, np.ndarray], np.ndarray]] = None
+
+REGISTRO_MERCADOS: Dict[str, MercadoSpec] = {}
+
+# Grade maior que a de liquidação: equivalências valem também nas grades estendidas (intervalo × final)
+MAX_GOLS_EQUIVALENCIA = 2 * MAX_GOLS_GRADE
+
+# Assinatura de liquidação → mercado registrado, e nome com separador decimal normalizado → mercado registrado
+ASSINATURAS_MERCADOS: Dict[bytes, str] = {}
+NOMES_NORMALIZADOS: Dict[str, str] = {}
+
+# Família → mercados registrados que a compõem, incluindo os equivalentes de outra família (ex.: 0x0 em Placar Exato)
+MEMBROS_FAMILIAS: Dict[str, List[str]] = {}
+
+def normalizar_nome_mercado(nome: str) -> str:
+    """Nome comparável entre mercados principais ('0,5') e gerados ('0.5')"""
+    return nome.replace(',', '.')
+
+def assinatura_liquidacao(liquidacao: Callable, reembolso: Optional[Callable] = None) -> bytes:
+    """Vitória e reembolso em todos os cenários reais - mesma assinatura = mesmo pagamento em qualquer placar"""
+    h, a, p = grade_cenarios(MAX_GOLS_EQUIVALENCIA)
+    reais = mascara_cenarios_reais(MAX_GOLS_EQUIVALENCIA)
+    vence = np.broadcast_to(liquidacao(h, a, p), h.shape).ravel()[reais]
+    devolve = np.zeros(vence.shape) if reembolso is None else np.broadcast_to(reembolso(h, a, p), h.shape).ravel()[reais]
+    return np.concatenate([vence, devolve]).astype(float).tobytes()
+
+def registrar_mercado(codigo: str, nome: str, liquidacao: Callable, chave_probabilidade: Optional[str] = None,
+                      grupo: str = "Principal", reembolso: Optional[Callable] = None) -> MercadoSpec:
+    """Adiciona um mercado ao registro - a máscara é compilada junto com as demais na importação"""
+    if nome in REGISTRO_MERCADOS:
+        raise ValueError(f"Mercado já registrado: {nome}")
+    spec = MercadoSpec(codigo, nome, liquidacao, chave_probabilidade, grupo, reembolso)
+    REGISTRO_MERCADOS[nome] = spec
+    ASSINATURAS_MERCADOS.setdefault(assinatura_liquidacao(liquidacao, reembolso), nome)
+    NOMES_NORMALIZADOS.setdefault(normalizar_nome_mercado(nome), nome)
+    MEMBROS_FAMILIAS.setdefault(grupo, []).append(nome)
+    return spec
+
+# 🔥 MERCADOS PRINCIPAIS - ÚNICA FONTE DA LIQUIDAÇÃO E DO MAPEAMENTO DE PROBABILIDADES
+for _bet_type, _liquidacao, _chave in [
+    (BetType.EXACT_0_0, lambda h, a, p: (h == 0) & (a == 0), "prob_0x0"),
+    (BetType.EXACT_1_0, lambda h, a, p: (h == 1) & (a == 0), "prob_vitoria_favorito_1x0"),
+    (BetType.UNDER_15, lambda h, a, p: (h + a) < 1.5, "prob_menos_15_gols"),
+    (BetType.DOUBLE_CHANCE_X2, lambda h, a, p: a >= h, "prob_empate_ou_vitoria_azarao"),
+    (BetType.OVER_05_AZARAO, lambda h, a, p: a > 0.5, "prob_mais_05_gols_azarao"),
+    (BetType.NEXT_GOAL_FAV, lambda h, a, p: p == PRIMEIRO_GOL_INDICE[True], "prob_proximo_gol_favorito"),
+    (BetType.VITORIA_FAV, lambda h, a, p: h > a, "prob_vitoria_favorito"),
+    (BetType.OVER_15, lambda h, a, p: (h + a) > 1.5, "prob_mais_15_gols"),
+    (BetType.EXACT_1_1, lambda h, a, p: (h == 1) & (a == 1), "prob_1x1"),
+    (BetType.OVER_15_BOTH_NO, lambda h, a, p: ((h + a) > 1.5) & ~((h > 0) & (a > 0)), "prob_mais_15_ambas_nao"),
+    (BetType.UNDER_25_DC_1X, lambda h, a, p: ((h + a) < 2.5) & (h >= a),
+     "prob_menos_25_gols_empate_ou_vitoria_favorito"),
+    (BetType.OVER_25_DC_12, lambda h, a, p: ((h + a) > 2.5) & (h != a), "prob_mais_25_gols_sem_empate"),
+]:
+    registrar_mercado(_bet_type.name, _bet_type.value, _liquidacao, _chave)
+
+# Mercados gerados não registrados por já existir um equivalente (mesmo nome ou mesma liquidação) → nome registrado
+EQUIVALENTES_MERCADOS: Dict[str, str] = {}
+
+def registrar_gerado(codigo: str, nome: str, liquidacao: Callable, grupo: str, reembolso: Optional[Callable] = None,
+                     chave_probabilidade: Optional[str] = None) -> Optional[MercadoSpec]:
+    """Mercado gerado: repetições de um mercado existente não são registradas, só anotadas em EQUIVALENTES_MERCADOS
+
+    O equivalente passa a fazer parte da família do mercado gerado (para os livros de remoção de margem)."""
+    equivalente = (NOMES_NORMALIZADOS.get(normalizar_nome_mercado(nome))
+                   or ASSINATURAS_MERCADOS.get(assinatura_liquidacao(liquidacao, reembolso)))
+    if equivalente is None:
+        return registrar_mercado(codigo, nome, liquidacao, chave_probabilidade, grupo, reembolso)
+    if equivalente != nome:
+        EQUIVALENTES_MERCADOS[nome] = equivalente
+    if equivalente not in MEMBROS_FAMILIAS.setdefault(grupo, []):
+        MEMBROS_FAMILIAS[grupo].append(equivalente)
+    return None
+
+# =============================================
+# 🏁 RESULTADO FINAL (1X2) E PLACAR EXATO
+# =============================================
+
+# Placares exatos listados até N×N gols; os demais ficam em "Placar Exato Outro"
+LIMITE_PLACAR_EXATO = 3
+
+registrar_gerado("RESULTADO_FAV", "Vitória Favorito", lambda h, a, p: h > a, "Resultado Final")
+registrar_gerado("RESULTADO_EMP", "Empate", lambda h, a, p: h == a, "Resultado Final", chave_probabilidade="prob_empate")
+registrar_gerado("RESULTADO_AZA", "Vitória Azarão", lambda h, a, p: h < a, "Resultado Final",
+                 chave_probabilidade="prob_vitoria_azarao")
+
+for _h in range(LIMITE_PLACAR_EXATO + 1):
+    for _a in range(LIMITE_PLACAR_EXATO + 1):
+        registrar_gerado(f"PLACAR_{_h}_{_a}", f"Placar Exato {_h}x{_a}",
+                         lambda h, a, p, _h=_h, _a=_a: (h == _h) & (a == _a), "Placar Exato")
+registrar_gerado("PLACAR_OUTRO", "Placar Exato Outro",
+                 lambda h, a, p: np.maximum(h, a) > LIMITE_PLACAR_EXATO, "Placar Exato")
+
+# =============================================
+# 📚 MERCADOS DE LINHA GERADOS (GOLS, HANDICAP ASIÁTICO, AMBAS MARCAM)
+# =============================================
+
+# Linhas geradas por família
+LINHAS_GOLS_TOTAIS = np.arange(0.5, 6.5 + 0.25, 0.25)
+LINHAS_GOLS_EQUIPE = np.arange(0.5, 4.5 + 0.5, 1.0)
+LINHAS_HANDICAP = np.arange(-3.0, 3.0 + 0.25, 0.25)
+
+def componentes_linha(linha: float) -> List[float]:
+    """Linhas quartas (x.25/x.75) dividem a stake igualmente entre as duas linhas vizinhas"""
+    if (linha * 4) % 2:
+        return [linha - 0.25, linha + 0.25]
+    return [linha]
+
+def registrar_linha(codigo: str, nome: str, margem: Callable[[np.ndarray, np.ndarray], np.ndarray], linha: float,
+                    grupo: str) -> Optional[MercadoSpec]:
+    """Mercado de linha: cada parte da stake vence onde margem + linha > 0 e é devolvida onde = 0
+
+    Linhas que repetem um mercado existente (ex.: AH -0.5 = Vitória Favorito) não são registradas."""
+    componentes = componentes_linha(linha)
+    liquidacao = lambda h, a, p: sum((margem(h, a) + c > 0) for c in componentes) / len(componentes)
+    reembolso = lambda h, a, p: sum((margem(h, a) + c == 0) for c in componentes) / len(componentes)
+    if not (reembolso(*grade_cenarios(MAX_GOLS_EQUIVALENCIA)) > 0).any():
+        reembolso = None
+    return registrar_gerado(codigo, nome, liquidacao, grupo, reembolso)
+
+def formatar_linha(linha: float, sinal: bool = False) -> str:
+    return f"{linha:+g}" if sinal else f"{linha:g}"
+
+for _linha in LINHAS_GOLS_TOTAIS:
+    _codigo = formatar_linha(_linha).replace('.', '_')
+    registrar_linha(f"OVER_{_codigo}", f"Mais {formatar_linha(_linha)} Gols", lambda h, a: h + a, -_linha, "Gols Totais")
+    registrar_linha(f"UNDER_{_codigo}", f"Menos {formatar_linha(_linha)} Gols", lambda h, a: -(h + a), _linha, "Gols Totais")
+
+for _linha in LINHAS_GOLS_EQUIPE:
+    _codigo = formatar_linha(_linha).replace('.', '_')
+    for _equipe, _sufixo, _gols in [("FAV", "Favorito", lambda h, a: h), ("AZA", "Azarão", lambda h, a: a)]:
+        registrar_linha(f"OVER_{_codigo}_{_equipe}", f"Mais {formatar_linha(_linha)} Gols {_sufixo}",
+                        _gols, -_linha, "Gols por Equipe")
+        registrar_linha(f"UNDER_{_codigo}_{_equipe}", f"Menos {formatar_linha(_linha)} Gols {_sufixo}",
+                        lambda h, a, _gols=_gols: -_gols(h, a), _linha, "Gols por Equipe")
+
+for _linha in LINHAS_HANDICAP:
+    _codigo = formatar_linha(_linha, sinal=True).replace('.', '_').replace('+', 'P').replace('-', 'M')
+    registrar_linha(f"AH_FAV_{_codigo}", f"Handicap Asiático Favorito {formatar_linha(_linha, sinal=True)}",
+                    lambda h, a: h - a, _linha, "Handicap Asiático")
+    registrar_linha(f"AH_AZA_{_codigo}", f"Handicap Asiático Azarão {formatar_linha(_linha, sinal=True)}",
+                    lambda h, a: a - h, _linha, "Handicap Asiático")
+
+registrar_mercado("BTTS_SIM", "Ambas Marcam Sim", lambda h, a, p: (h > 0) & (a > 0), grupo="Ambas Marcam")
+registrar_mercado("BTTS_NAO", "Ambas Marcam Não", lambda h, a, p: ~((h > 0) & (a > 0)), grupo="Ambas Marcam")
+
+def compilar_mascaras(mercados: Tuple[str, ...], max_gols: int = MAX_GOLS_GRADE) -> np.ndarray:
+    """Avalia os predicados do registro sobre a grade de cenários: fração da stake que vence (mercados × cenários)"""
+    h, a, p = grade_cenarios(max_gols)
+    mascaras = np.zeros((len(mercados), h.size))
+    for i, mercado in enumerate(mercados):
+        mascaras[i] = np.broadcast_to(REGISTRO_MERCADOS[mercado].liquidacao(h, a, p), h.shape).ravel()
+    return mascaras
+
+def compilar_reembolsos(mercados: Tuple[str, ...], max_gols: int = MAX_GOLS_GRADE) -> np.ndarray:
+    """Fração da stake devolvida em cada cenário (mercados × cenários) - zero para mercados sem linha de push"""
+    h, a, p = grade_cenarios(max_gols)
+    reembolsos = np.zeros((len(mercados), h.size))
+    for i, mercado in enumerate(mercados):
+        reembolso = REGISTRO_MERCADOS[mercado].reembolso
+        if reembolso is not None:
+            reembolsos[i] = np.broadcast_to(reembolso(h, a, p), h.shape).ravel()
+    return reembolsos
+
+def mercados_do_grupo(grupo: str = "Principal", registro: Optional[Dict[str, MercadoSpec]] = None) -> List[MercadoSpec]:
+    """Mercados registrados de um grupo, na ordem de registro"""
+    registro = REGISTRO_MERCADOS if registro is None else registro
+    return [spec for spec in registro.values() if spec.grupo == grupo]
+
+def grupos_mercados(registro: Optional[Dict[str, MercadoSpec]] = None) -> List[str]:
+    """Grupos do registro na ordem de registro"""
+    registro = REGISTRO_MERCADOS if registro is None else registro
+    return list(dict.fromkeys(spec.grupo for spec in registro.values()))
+
+def probabilidades_mercados(prob_cenarios: np.ndarray) -> Dict[str, float]:
+    """Probabilidade de cada mercado registrado a partir das probabilidades dos cenários da grade padrão"""
+    return dict(zip(REGISTRO_MERCADOS, (MASCARAS_MERCADOS @ np.asarray(prob_cenarios, dtype=float)).tolist()))
+
+# 🔥 COMPILADO NA IMPORTAÇÃO - LIQUIDAÇÃO, PROBABILIDADES E INTERFACE LEEM AS MESMAS MÁSCARAS
+MASCARAS_MERCADOS = compilar_mascaras(tuple(REGISTRO_MERCADOS))
+MASCARAS_MERCADOS.setflags(write=False)
+REEMBOLSOS_MERCADOS = compilar_reembolsos(tuple(REGISTRO_MERCADOS))
+REEMBOLSOS_MERCADOS.setflags(write=False)
+INDICE_MERCADO = {nome: i for i, nome in enumerate(REGISTRO_MERCADOS)}
+
+# =============================================
+# ⚖️ REMOÇÃO DE MARGEM - ODDS JUSTAS POR LIVRO
+# =============================================
+
+METODOS_REMOCAO_MARGEM = ('multiplicativo', 'potencia', 'shin')
+METODO_REMOCAO_MARGEM = 'shin'
+
+def particoes_exatas(mascaras: np.ndarray) -> Iterator[Tuple[int, ...]]:
+    """Conjuntos de linhas (máscaras 0/1) que cobrem cada coluna exatamente uma vez - Algoritmo X de Knuth
+
+    Cada partição sai uma única vez: em cada nível só as linhas que cobrem a coluna menos coberta são tentadas."""
+    mascaras = np.asarray(mascaras, dtype=bool)
+    
+    def buscar(descobertas: np.ndarray, disponiveis: np.ndarray, escolhidas: Tuple[int, ...]):
+        if not descobertas.any():
+            yield escolhidas
+            return
+        cobertura = mascaras[disponiveis][:, descobertas]
+        contagem = cobertura.sum(axis=0)
+        coluna = int(np.argmin(contagem))
+        for linha in disponiveis[cobertura[:, coluna]]:
+            compativeis = disponiveis[~(mascaras[disponiveis] & mascaras[linha]).any(axis=1)]
+            yield from buscar(descobertas & ~mascaras[linha], compativeis, escolhidas + (int(linha),))
+    
+    yield from buscar(np.ones(mascaras.shape[1], dtype=bool), np.flatnonzero(mascaras.any(axis=1)), ())
+
+def identificar_livros(max_gols: int = MAX_GOLS_GRADE) -> Dict[str, Tuple[str, ...]]:
+    """Livros completos: mercados sem reembolso de uma mesma família cujas máscaras somam 1 em todo cenário real
+
+    Cada mercado tem um único livro canônico - o primeiro que o contém, na ordem das famílias (1X2 e placar exato
+    antes das linhas); livros sem nenhuma perna nova são descartados. 'Principal' é uma seleção, não uma família."""
+    reais = mascara_cenarios_reais(max_gols)
+    livros, canonicos = {}, set()
+    for familia, membros in MEMBROS_FAMILIAS.items():
+        if familia == "Principal":
+            continue
+        nomes = tuple(membros)
+        mascaras = compilar_mascaras(nomes, max_gols)[:, reais]
+        binarios = np.all((mascaras == 0) | (mascaras == 1), axis=1) & ~compilar_reembolsos(nomes, max_gols).any(axis=1)
+        candidatos = [nome for nome, binario in zip(nomes, binarios) if binario]
+        
+        particoes = sorted(particoes_exatas(mascaras[binarios]), key=len)
+        for particao in particoes:
+            pernas = tuple(candidatos[i] for i in sorted(particao))
+            if canonicos.issuperset(pernas):
+                continue
+            nome = " × ".join(pernas) if len(pernas) == 2 else familia
+            if nome in livros:
+                nome = f"{nome} ({len(livros)})"
+            livros[nome] = pernas
+            canonicos.update(pernas)
+    return livros
+
+def livro_canonico(livros: Dict[str, Tuple[str, ...]]) -> Dict[str, str]:
+    """Mercado → único livro usado na sua remoção de margem (o primeiro que o contém)"""
+    canonico = {}
+    for nome, pernas in livros.items():
+        for perna in pernas:
+            canonico.setdefault(perna, nome)
+    return canonico
+
+def remover_margem(odds: np.ndarray, metodo: str = METODO_REMOCAO_MARGEM, iteracoes: int = 60) -> np.ndarray:
+    """Probabilidades justas de livros completos - o último eixo são as pernas do livro, os anteriores são vetorizados
+
+    multiplicativo: q/Σq | potencia: q^k com Σ = 1 | shin: fração z de apostadores informados (Shin, 1993)."""
+    implicitas = 1 / np.asarray(odds, dtype=float)
+    soma = implicitas.sum(axis=-1, keepdims=True)
+    
+    if metodo == 'multiplicativo':
+        return implicitas / soma
+    
+    if metodo == 'potencia':
+        # Newton em k para Σ q^k = 1 (convexa e decrescente em k)
+        k = np.ones_like(soma)
+        log_q = np.log(implicitas)
+        convergido = np.zeros_like(soma, dtype=bool)
+        for _ in range(iteracoes):
+            potencias = implicitas ** k
+            passo = (potencias.sum(axis=-1, keepdims=True) - 1) / (potencias * log_q).sum(axis=-1, keepdims=True)
+            # Livros já convergidos ficam parados - o resultado não depende de com quem foram empilhados
+            k = np.where(convergido, k, k - passo)
+            convergido |= np.abs(passo) < 1e-12
+            if convergido.all():
+                break
+        return implicitas ** k
+    
+    if metodo == 'shin':
+        def probabilidades_shin(z):
+            return (np.sqrt(z ** 2 + 4 * (1 - z) * implicitas ** 2 / soma) - z) / (2 * (1 - z))
+        
+        # Σp decresce em z: bissecção vetorizada entre 0 (Σ = √Σq ≥ 1) e o limite superior
+        inferior, superior = np.zeros_like(soma), np.full_like(soma, 0.999)
+        for _ in range(iteracoes):
+            z = (inferior + superior) / 2
+            acima = probabilidades_shin(z).sum(axis=-1, keepdims=True) > 1
+            inferior, superior = np.where(acima, z, inferior), np.where(acima, superior, z)
+        probabilidades = probabilidades_shin((inferior + superior) / 2)
+        return probabilidades / probabilidades.sum(axis=-1, keepdims=True)
+    
+    raise ValueError(f"Método de remoção de margem desconhecido: {metodo} (use {', '.join(METODOS_REMOCAO_MARGEM)})")
+
+def analisar_livros(odds: Dict[str, float], metodo: str = METODO_REMOCAO_MARGEM,
+                    livros: Optional[Dict[str, Tuple[str, ...]]] = None) -> Dict[str, Dict]:
+    """Margem e probabilidades justas (%) de cada livro completo com todas as odds informadas"""
+    livros = LIVROS_MERCADOS if livros is None else livros
+    completos = {nome: pernas for nome, pernas in livros.items() if all(odds.get(perna, 0) > 1 for perna in pernas)}
+    if not completos:
+        return {}
+    
+    # Livros do mesmo tamanho empilhados e resolvidos de uma vez
+    resultado = {}
+    for tamanho in {len(pernas) for pernas in completos.values()}:
+        nomes = [nome for nome, pernas in completos.items() if len(pernas) == tamanho]
+        matriz_odds = np.array([[odds[perna] for perna in completos[nome]] for nome in nomes])
+        justas = remover_margem(matriz_odds, metodo)
+        margens = (1 / matriz_odds).sum(axis=1) - 1
+        for nome, probabilidades, margem in zip(nomes, justas, margens.tolist()):
+            resultado[nome] = {
+                'pernas': completos[nome],
+                'margem': margem * 100,
+                'probabilidades_justas': dict(zip(completos[nome], (probabilidades * 100).tolist())),
+            }
+    return {nome: resultado[nome] for nome in completos}
+
+def remover_margem_rodada(odds_partidas: pd.DataFrame, metodo: str = METODO_REMOCAO_MARGEM,
+                          livros: Optional[Dict[str, Tuple[str, ...]]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Probabilidades justas (%) e margem (%) por livro para várias partidas - colunas = mercados, linhas = partidas
+
+    Livros com alguma odd ausente na partida ficam NaN."""
+    livros = LIVROS_MERCADOS if livros is None else livros
+    livros = {nome: pernas for nome, pernas in livros.items() if all(perna in odds_partidas.columns for perna in pernas)}
+    justas = pd.DataFrame(np.nan, index=odds_partidas.index, columns=list(dict.fromkeys(
+        perna for nome, pernas in livros.items() for perna in pernas if LIVRO_CANONICO.get(perna) == nome)))
+    margens = pd.DataFrame(np.nan, index=odds_partidas.index, columns=list(livros))
+    
+    for tamanho in {len(pernas) for pernas in livros.values()}:
+        nomes = [nome for nome, pernas in livros.items() if len(pernas) == tamanho]
+        # partidas × livros × pernas
+        matriz_odds = np.stack([odds_partidas[list(livros[nome])].to_numpy(dtype=float) for nome in nomes], axis=1)
+        validas = np.all(matriz_odds > 1, axis=-1)
+        matriz_odds = np.where(validas[..., None], matriz_odds, 2.0)
+        probabilidades = np.where(validas[..., None], remover_margem(matriz_odds, metodo) * 100, np.nan)
+        margens[nomes] = np.where(validas, ((1 / matriz_odds).sum(axis=-1) - 1) * 100, np.nan)
+        for posicao, nome in enumerate(nomes):
+            for perna, coluna in zip(livros[nome], probabilidades[:, posicao, :].T):
+                # Cada mercado só recebe a probabilidade justa do seu livro canônico
+                if LIVRO_CANONICO.get(perna) == nome:
+                    justas[perna] = coluna
+    return justas, margens
+
+LIVROS_MERCADOS = identificar_livros()
+LIVRO_CANONICO = livro_canonico(LIVROS_MERCADOS)
 
 # =============================================
 # 🔄 SISTEMA DE DISTRIBUIÇÕES OTIMIZADAS
@@ -312,7 +702,7 @@ def render_controls():
                     new_investment = st.number_input(
                         f"{bet_type.value} - R$",
                         min_value=0.0,
-                        max_value=100.0,
+                        max_value=STAKE_MAXIMA_MERCADO,
                         value=float(current_investment),
                         step=0.10,
                         # 🔥 CORREÇÃO CRÍTICA: KEY ÚNICA POR TIPO + ÍNDICE + CONTEXTO
@@ -559,6 +949,8 @@ def init_state():
             'sistema_aplicacoes': SistemaAplicacoes(),
             'distribuicao_ativa': None,
             'distribuicao_detalhes': None,
+            'mercados_linha': {},
+            'mercados_tempos': {},
         }
         update_proportions_from_investments()
     
@@ -848,134 +1240,197 @@ Baseado nas estatísticas acima e na distribuição atual, por favor forneça:
 class ValueBetAnalyzer:
     def __init__(self):
         self.analysis_results = {}
+        # Estado da última análise completa, usado nas atualizações incrementais
+        self._estatisticas: Optional[Dict] = None
+        self._prob_reais: Dict = {}
+        self._investments: Dict = {}
+        self._odds: Dict = {}
+        self._livros: Dict[str, Dict] = {}
+        self._probabilidades_justas: Dict[str, Tuple[float, float]] = {}
+        self._matrizes_placares: OrderedDict = OrderedDict()
+        self.metodo_margem = METODO_REMOCAO_MARGEM
         
+    def matriz_placares(self, estatisticas: Dict) -> np.ndarray:
+        """Matriz de placares (Poisson com correção Dixon–Coles) - cache pela tupla de estatísticas"""
+        chave = tuple(sorted(estatisticas.items()))
+        if chave not in self._matrizes_placares:
+            if len(self._matrizes_placares) >= 32:
+                self._matrizes_placares.popitem(last=False)
+            self._matrizes_placares[chave] = matriz_placares_poisson(
+                *lambdas_estatisticas(estatisticas), rho=estatisticas.get('rho_dixon_coles', RHO_DIXON_COLES))
+        return self._matrizes_placares[chave]
+    
     def calcular_probabilidades_reais_otimizadas(self, estatisticas: Dict) -> Dict:
-        """Cálculo otimizado baseado nas estatísticas reais"""
-        vit_fav = estatisticas.get('vitorias_favorito', 3)
-        gols_fav_f = estatisticas.get('gols_feitos_favorito', 8)
-        gols_fav_s = estatisticas.get('gols_sofridos_favorito', 3)
-        vit_aza = estatisticas.get('vitorias_azarao', 1)
-        gols_aza_f = estatisticas.get('gols_feitos_azarao', 4)
-        gols_aza_s = estatisticas.get('gols_sofridos_azarao', 10)
-        
-        # 🔥 CÁLCULOS OTIMIZADOS BASEADOS NA ANÁLISE ESTATÍSTICA
-        prob_vitoria_favorito = min(75, max(25, (vit_fav/5) * 100 * 0.65 + (gols_fav_f/5) * 12))
-        prob_empate = min(35, max(15, 100 - prob_vitoria_favorito - (vit_aza/5) * 100 * 0.45))
-        prob_vitoria_azarao = max(10, 100 - prob_vitoria_favorito - prob_empate)
-        
-        # Probabilidades derivadas com base realística
-        prob_menos_25_gols = min(75, max(25, 60 - (gols_fav_f/5 + gols_aza_f/5) * 6))
-        prob_mais_15_gols = 100 - prob_menos_25_gols
-        prob_ambas_marcam = min(55, max(15, (gols_fav_f/10 + gols_aza_f/10) * 25))
-        
-        # NOVA PROBABILIDADE PARA MAIS 0,5 GOLS AZARÃO
-        prob_azarao_marca = min(70, max(20, (gols_aza_f/5) * 15 + (gols_fav_s/5) * 10))
+        """Probabilidades de todos os mercados a partir da mesma matriz de placares, via máscaras de liquidação"""
+        prob_placares = self.matriz_placares(estatisticas)
+        prob_mercados = probabilidades_mercados(probabilidades_cenarios(prob_placares))
         
         return {
-            "prob_vitoria_favorito": prob_vitoria_favorito,
-            "prob_empate": prob_empate,
-            "prob_vitoria_azarao": prob_vitoria_azarao,
-            "prob_empate_ou_vitoria_azarao": prob_empate + prob_vitoria_azarao,
-            "prob_menos_25_gols_empate_ou_vitoria_favorito": prob_menos_25_gols * (prob_vitoria_favorito + prob_empate) / 100,
-            "prob_mais_15_ambas_nao": prob_mais_15_gols * (100 - prob_ambas_marcam) / 100,
-            "prob_0x0": max(3, (100 - prob_mais_15_gols) * 0.4),
-            "prob_menos_15_gols": max(8, prob_menos_25_gols * 0.7),
-            "prob_mais_25_gols_sem_empate": prob_mais_15_gols * (100 - prob_empate) / 100,
-            "prob_proximo_gol_favorito": prob_vitoria_favorito * 0.6 + prob_empate * 0.3,
-            # NOVA PROBABILIDADE
-            "prob_mais_05_gols_azarao": prob_azarao_marca
+            spec.chave_probabilidade: prob_mercados[spec.nome] * 100
+            for spec in REGISTRO_MERCADOS.values() if spec.chave_probabilidade
         }
     
-    # ATUALIZAR O MAPPING DE PROBABILIDADES (no ValueBetAnalyzer)
+    # Mapeamento mercado → chave de probabilidade, lido do registro de mercados
+    MAPPING_PROBABILIDADES = {
+        spec.nome: spec.chave_probabilidade
+        for spec in REGISTRO_MERCADOS.values() if spec.chave_probabilidade
+    }
+    
     def analisar_valor_apostas(self, investments: Dict, odds: Dict, estatisticas: Dict) -> Dict:
         """Análise completa de valor das apostas"""
         prob_reais = self.calcular_probabilidades_reais_otimizadas(estatisticas)
         
-        mapping_probabilidades = {
-            "Vitória Favorito": "prob_vitoria_favorito",
-            "Dupla Chance X2": "prob_empate_ou_vitoria_azarao", 
-            "Menos 2.5 & Dupla Chance 1X": "prob_menos_25_gols_empate_ou_vitoria_favorito",
-            "Mais 1.5 & Ambas Não": "prob_mais_15_ambas_nao",
-            "Resultado 0x0": "prob_0x0",
-            "Resultado 1x0 FAVORITO": "prob_vitoria_favorito_1x0",  # 🔥 NOVO MAPEAMENTO
-            "Resultado 1x1": "prob_empate",
-            "Menos 1.5 Gols": "prob_menos_15_gols",
-            "Mais 2.5 & Dupla Chance 12": "prob_mais_25_gols_sem_empate",
-            "Próximo Gol Favorito": "prob_proximo_gol_favorito",
-            "Mais 0,5 Gols Azarão": "prob_mais_05_gols_azarao"
-        }
-        
-        # 🔥 ADICIONAR PROBABILIDADE ESPECÍFICA PARA 1x0
-        prob_reais["prob_vitoria_favorito_1x0"] = min(15, max(5, prob_reais["prob_vitoria_favorito"] * 0.25))
+        self._estatisticas = dict(estatisticas)
+        self._prob_reais = prob_reais
+        self._investments = dict(investments)
+        self._odds = dict(odds)
+        self._livros = analisar_livros(odds, self.metodo_margem)
+        self._indexar_probabilidades_justas()
         
         analise_detalhada = {}
-        total_ev = 0
-        total_investido = 0
-        
         for mercado, investimento in investments.items():
             if investimento > 0:
-                odd = odds.get(mercado, 1.0)
-                prob_chave = mapping_probabilidades.get(mercado)
-                prob_real = prob_reais.get(prob_chave, 50) if prob_chave else 50
-                
-                # 🔥 CÁLCULOS DE VALOR OTIMIZADOS
-                prob_implícita = (1 / odd) * 100
-                valor_aposta = ((prob_real - prob_implícita) / prob_implícita) * 100
-                
-                # Expected Value (EV)
-                ev = (prob_real/100 * odd * investimento) - investimento
-                total_ev += ev
-                total_investido += investimento
-                
-                # ROI Esperado
-                roi_esperado = (ev / investimento * 100) if investimento > 0 else 0
-                
-                analise_detalhada[mercado] = {
-                    'investimento': investimento,
-                    'odds': odd,
-                    'probabilidade_real': prob_real,
-                    'probabilidade_implícita': prob_implícita,
-                    'valor_aposta': valor_aposta,
-                    'ev': ev,
-                    'roi_esperado': roi_esperado,
-                    'status_valor': '✅ ALTO VALOR' if valor_aposta > 10 else 
-                                '✅ VALOR' if valor_aposta > 5 else 
-                                '⚠️ NEUTRO' if valor_aposta >= -5 else '❌ SEM VALOR',
-                    'recomendacao': 'AUMENTAR' if valor_aposta > 5 else 
-                                'MANTER' if valor_aposta >= -2 else 'REDUZIR'
-                }
+                analise_detalhada[mercado] = self._analisar_mercado(mercado, investimento, odds.get(mercado, 1.0))
         
-        # 🔥 ANÁLISE DA CARTEIRA COMPLETA
-        roi_total = (total_ev / total_investido * 100) if total_investido > 0 else 0
-        margem_casa = 100 - sum([(1/odd)*100 for odd in odds.values() if odd > 0])
+        self.analysis_results = {'detalhes': analise_detalhada, 'resumo': {}}
+        self._atualizar_resumo()
         
-        self.analysis_results = {
-            'detalhes': analise_detalhada,
-            'resumo': {
-                'total_investido': total_investido,
-                'ev_total': total_ev,
-                'roi_esperado_total': roi_total,
-                'margem_casa': margem_casa,
-                'numero_apostas': len([inv for inv in investments.values() if inv > 0]),
-                'apostas_lucrativas': sum(1 for aposta in analise_detalhada.values() if aposta['ev'] > 0)
-            }
-        }
+        return self.analysis_results
+    
+    def atualizar_analise(self, investments: Dict, odds: Dict, estatisticas: Dict) -> Dict:
+        """Reaproveita a última análise e recalcula apenas os mercados cujo investimento ou odd mudou"""
+        if (not self.analysis_results or estatisticas != self._estatisticas
+                or investments.keys() != self._investments.keys() or odds.keys() != self._odds.keys()):
+            return self.analisar_valor_apostas(investments, odds, estatisticas)
+        
+        alterados = [mercado for mercado in odds.keys() | investments.keys()
+                     if investments.get(mercado) != self._investments.get(mercado) or odds.get(mercado) != self._odds.get(mercado)]
+        for mercado in alterados:
+            self.atualizar_mercado(mercado, investments.get(mercado, 0.0), odds.get(mercado, 1.0))
         
         return self.analysis_results
+    
+    def atualizar_mercado(self, mercado: str, investimento: float, odd: float):
+        """Atualiza a contribuição de um único mercado nas métricas de valor e no resumo"""
+        odd_anterior = self._odds.get(mercado)
+        if mercado in self._investments:
+            self._investments[mercado] = investimento
+        self._odds[mercado] = odd
+        
+        # Só os livros que contêm o mercado mudam de margem; as outras pernas ganham nova probabilidade justa
+        afetados = {mercado}
+        if odd != odd_anterior:
+            livros = {nome: pernas for nome, pernas in LIVROS_MERCADOS.items() if mercado in pernas}
+            for nome in livros:
+                self._livros.pop(nome, None)
+            self._livros.update(analisar_livros(self._odds, self.metodo_margem, livros))
+            self._livros = {nome: self._livros[nome] for nome in LIVROS_MERCADOS if nome in self._livros}
+            self._indexar_probabilidades_justas()
+            afetados.update(perna for pernas in livros.values() for perna in pernas)
+        
+        detalhes = self.analysis_results['detalhes']
+        for afetado in afetados:
+            detalhes.pop(afetado, None)
+            if self._investments.get(afetado, 0) > 0:
+                detalhes[afetado] = self._analisar_mercado(afetado, self._investments[afetado], self._odds.get(afetado, 1.0))
+        # Preservar a ordem original dos mercados
+        self.analysis_results['detalhes'] = {m: detalhes[m] for m in self._investments if m in detalhes}
+        
+        self._atualizar_resumo()
+    
+    def _indexar_probabilidades_justas(self):
+        """Probabilidade justa e margem de cada mercado - só do seu livro canônico, quando completo"""
+        self._probabilidades_justas = {}
+        for nome, livro in self._livros.items():
+            for perna, probabilidade in livro['probabilidades_justas'].items():
+                if LIVRO_CANONICO.get(perna) == nome:
+                    self._probabilidades_justas[perna] = (probabilidade, livro['margem'])
+    
+    def _analisar_mercado(self, mercado: str, investimento: float, odd: float) -> Dict:
+        """Métricas de valor de um mercado"""
+        prob_chave = self.MAPPING_PROBABILIDADES.get(mercado)
+        prob_real = self._prob_reais.get(prob_chave, 50) if prob_chave else 50
+        
+        prob_implícita = (1 / odd) * 100
+        
+        # Probabilidade do mercado sem a margem do livro (None se o livro não estiver completo)
+        prob_justa, margem_livro = self._probabilidades_justas.get(mercado, (None, None))
+        
+        # 🔥 VALOR CONTRA O PREÇO JUSTO DO MERCADO - SEM LIVRO COMPLETO, CONTRA A ODD BRUTA
+        prob_mercado = prob_justa if prob_justa is not None else prob_implícita
+        valor_aposta = ((prob_real - prob_mercado) / prob_mercado) * 100
+        
+        # Expected Value (EV)
+        ev = (prob_real/100 * odd * investimento) - investimento
+        
+        # ROI Esperado
+        roi_esperado = (ev / investimento * 100) if investimento > 0 else 0
+        
+        return {
+            'investimento': investimento,
+            'odds': odd,
+            'probabilidade_real': prob_real,
+            'probabilidade_implícita': prob_implícita,
+            'probabilidade_justa': prob_justa,
+            'margem_livro': margem_livro,
+            'vantagem_sobre_mercado': prob_real - prob_mercado,
+            'valor_aposta': valor_aposta,
+            'ev': ev,
+            'roi_esperado': roi_esperado,
+            'status_valor': '✅ ALTO VALOR' if valor_aposta > 10 else 
+                        '✅ VALOR' if valor_aposta > 5 else 
+                        '⚠️ NEUTRO' if valor_aposta >= -5 else '❌ SEM VALOR',
+            'recomendacao': 'AUMENTAR' if valor_aposta > 5 else 
+                        'MANTER' if valor_aposta >= -2 else 'REDUZIR'
+        }
+    
+    def _atualizar_resumo(self):
+        """🔥 ANÁLISE DA CARTEIRA COMPLETA"""
+        detalhes = self.analysis_results['detalhes']
+        total_ev = sum(aposta['ev'] for aposta in detalhes.values())
+        total_investido = sum(aposta['investimento'] for aposta in detalhes.values())
+        roi_total = (total_ev / total_investido * 100) if total_investido > 0 else 0
+        
+        self.analysis_results['resumo'] = {
+            'total_investido': total_investido,
+            'ev_total': total_ev,
+            'roi_esperado_total': roi_total,
+            # Média das margens dos livros completos - mercados de livros diferentes não se somam
+            'margem_casa': float(np.mean([livro['margem'] for livro in self._livros.values()])) if self._livros else float('nan'),
+            'margens_livros': {nome: livro['margem'] for nome, livro in self._livros.items()},
+            'metodo_margem': self.metodo_margem,
+            'numero_apostas': len(detalhes),
+            'apostas_lucrativas': sum(1 for aposta in detalhes.values() if aposta['ev'] > 0)
+        }
 
 # =============================================
 # 📊 SISTEMA DE PLANOS DE INVESTIMENTO
 # =============================================
 
+# Teto por mercado - limite dos campos de investimento da interface e dos planos aplicados
+STAKE_MAXIMA_MERCADO = 100.0
+
+# Fração do Kelly completo aplicada nos planos (meio Kelly)
+FRACAO_KELLY = 0.5
+
 class InvestmentPlanner:
     def __init__(self):
         self.plans = {}
+        self._odds: Dict[str, float] = {}
+        # Última solução de Kelly por conjunto de mercados - ponto de partida do próximo tick de odds
+        self._kelly_anterior: Dict[Tuple[str, ...], np.ndarray] = {}
     
-    def gerar_planos_otimizados(self, analysis: Dict, bankroll: float) -> Dict:
-        """Gera os 3 planos otimizados (Conservador, Balanceado, Agressivo)"""
+    def gerar_planos_otimizados(self, analysis: Dict, bankroll: float, prob_placares: Optional[np.ndarray] = None,
+                                odds: Optional[Dict[str, float]] = None, fracao_kelly: float = FRACAO_KELLY) -> Dict:
+        """Gera os 3 planos otimizados (Conservador, Balanceado, Agressivo) e, com probabilidades, o plano Kelly
+
+        Com a matriz de probabilidades de placares, EV/risco são exatos sobre a grade de payoff conjunta."""
         
         detalhes = analysis.get('detalhes', {})
         total_atual = analysis.get('resumo', {}).get('total_investido', bankroll)
+        # Odds de todos os mercados (o Kelly pode alocar em mercados ainda sem investimento)
+        self._odds = {mercado: dados['odds'] for mercado, dados in detalhes.items()}
+        self._odds.update(odds or {})
         
         # 🔥 PLANO CONSERVADOR (Minimiza variação)
         plano_conservador = self._gerar_plano_conservador(detalhes, bankroll)
@@ -990,11 +1445,72 @@ class InvestmentPlanner:
             'conservador': self._calcular_metricas_plano(plano_conservador, detalhes, bankroll),
             'balanceado': self._calcular_metricas_plano(plano_balanceado, detalhes, bankroll),
             'agressivo': self._calcular_metricas_plano(plano_agressivo, detalhes, bankroll),
-            'atual': self._calcular_metricas_plano({mercado: det['investimento'] for mercado, det in detalhes.items()}, detalhes, bankroll)
         }
+        if prob_placares is not None:
+            # 🔥 PLANO KELLY (Maximiza o crescimento do bankroll)
+            plano_kelly = self._gerar_plano_kelly(bankroll, prob_placares, fracao_kelly)
+            self.plans['kelly'] = self._calcular_metricas_plano(plano_kelly, detalhes, bankroll)
+        self.plans['atual'] = self._calcular_metricas_plano({mercado: det['investimento'] for mercado, det in detalhes.items()}, detalhes, bankroll)
+        
+        self._adicionar_metricas_cenarios(detalhes, prob_placares)
         
         return self.plans
     
+    def _adicionar_metricas_cenarios(self, detalhes: Dict, prob_placares: Optional[np.ndarray] = None):
+        """Extremos e (com probabilidades) EV, risco, VaR e CVaR exatos de todos os planos num único lote vetorizado"""
+        max_gols = prob_placares.shape[0] - 1 if prob_placares is not None else MAX_GOLS_GRADE
+        mercados = tuple(bet_type.value for bet_type in BetType)
+        odds = np.array([self._odds.get(m, 1.0) for m in mercados])
+        stakes = np.array([[plano['alocacoes'].get(m, 0.0) for m in mercados] for plano in self.plans.values()])
+        
+        lucros = calcular_lucros_carteiras(stakes, odds, mercados, max_gols)
+        for plano, pior, melhor in zip(self.plans.values(), lucros.min(axis=1), lucros.max(axis=1)):
+            plano['metricas']['pior_cenario'] = float(pior)
+            plano['metricas']['melhor_cenario'] = float(melhor)
+        
+        if prob_placares is None:
+            return
+        
+        risco = calcular_metricas_risco(lucros, probabilidades_cenarios(prob_placares))
+        for i, plano in enumerate(self.plans.values()):
+            metricas = plano['metricas']
+            metricas['ev_total'] = float(risco['ev'][i])
+            metricas['roi_esperado'] = (metricas['ev_total'] / metricas['total_investido'] * 100) if metricas['total_investido'] > 0 else 0
+            metricas['desvio_padrao'] = float(risco['desvio_padrao'][i])
+            metricas['probabilidade_lucro'] = float(risco['prob_lucro'][i] * 100)
+            metricas['var_95'] = float(risco['var'][i])
+            metricas['cvar_95'] = float(risco['cvar'][i])
+    
+    def _coeficientes_mercados(self, max_gols: int) -> Tuple[Tuple[str, ...], np.ndarray]:
+        """Mercados com odd e seus coeficientes de lucro por R$ 1 (odd·W + R − 1) em cada cenário"""
+        mercados = tuple(bet_type.value for bet_type in BetType if self._odds.get(bet_type.value, 0) > 1)
+        odds = np.array([self._odds[m] for m in mercados])
+        return mercados, coeficientes_liquidacao(odds, construir_matriz_indicadora(mercados, max_gols),
+                                                 construir_matriz_reembolso(mercados, max_gols))
+    
+    def fronteira_eficiente(self, bankroll: float, prob_placares: np.ndarray,
+                            aversoes: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """Curva risco × retorno (arrays prontos para o gráfico) com as odds do último gerar_planos_otimizados"""
+        mercados, coeficientes = self._coeficientes_mercados(prob_placares.shape[0] - 1)
+        fronteira = gerar_fronteira_eficiente(coeficientes, probabilidades_cenarios(prob_placares), bankroll, aversoes)
+        fronteira['mercados'] = mercados
+        return fronteira
+    
+    def _gerar_plano_kelly(self, bankroll: float, prob_placares: np.ndarray, fracao_kelly: float) -> Dict:
+        """Plano Kelly fracionário - crescimento ótimo sobre a distribuição conjunta de placares, com partida quente"""
+        mercados, coeficientes = self._coeficientes_mercados(prob_placares.shape[0] - 1)
+        if not mercados:
+            return {}
+        
+        fracoes = resolver_kelly(coeficientes, probabilidades_cenarios(prob_placares), self._kelly_anterior.get(mercados))
+        self._kelly_anterior[mercados] = fracoes
+        stakes = fracao_kelly * fracoes * bankroll
+        # Reduz o plano inteiro (mantendo as proporções do Kelly) até a maior stake caber no teto por mercado
+        maior_stake = stakes.max(initial=0.0)
+        if maior_stake > STAKE_MAXIMA_MERCADO:
+            stakes = stakes * (STAKE_MAXIMA_MERCADO / maior_stake)
+        return {mercado: stake for mercado, stake in zip(mercados, stakes.tolist()) if stake >= 0.005}
+    
     def _gerar_plano_conservador(self, detalhes: Dict, bankroll: float) -> Dict:
         """Plano conservador - foco em redução de variância"""
         plan = {}
@@ -1101,78 +1617,1015 @@ class InvestmentPlanner:
             elif z_score >= -0.5: return 31.0
             else: return 16.0
 
+# =============================================
+# ⚡ MOTOR VETORIZADO DE CENÁRIOS (MATRIZ DE PAYOFF)
+# =============================================
+
+@lru_cache(maxsize=32)
+def construir_matriz_indicadora(mercados: Tuple[str, ...], max_gols: int = MAX_GOLS_GRADE) -> np.ndarray:
+    """Matriz (mercados × cenários) com 1.0 onde a aposta vence - lida das máscaras pré-compiladas do registro"""
+    if max_gols == MAX_GOLS_GRADE:
+        matriz = MASCARAS_MERCADOS[[INDICE_MERCADO[mercado] for mercado in mercados]]
+    else:
+        matriz = compilar_mascaras(mercados, max_gols)
+    matriz.setflags(write=False)
+    return matriz
+
+@lru_cache(maxsize=32)
+def construir_matriz_reembolso(mercados: Tuple[str, ...], max_gols: int = MAX_GOLS_GRADE) -> Optional[np.ndarray]:
+    """Matriz (mercados × cenários) com a fração devolvida da stake - None quando nenhum mercado tem push"""
+    if max_gols == MAX_GOLS_GRADE:
+        matriz = REEMBOLSOS_MERCADOS[[INDICE_MERCADO[mercado] for mercado in mercados]]
+    else:
+        matriz = compilar_reembolsos(mercados, max_gols)
+    if not matriz.any():
+        return None
+    matriz.setflags(write=False)
+    return matriz
+
+def liquidar(stakes: np.ndarray, odds: np.ndarray, vitorias: np.ndarray,
+             reembolsos: Optional[np.ndarray] = None) -> np.ndarray:
+    """Retorno bruto por cenário de uma ou várias carteiras (último eixo = mercados): stake·odd·W + stake·R
+
+    Núcleo único da liquidação: lucro = retorno − Σ stakes; lucro por R$ 1 de cada mercado = liquidar(identidade) − 1."""
+    retornos = (stakes * odds) @ vitorias
+    if reembolsos is not None:
+        retornos = retornos + stakes @ reembolsos
+    return retornos
+
+def coeficientes_liquidacao(odds: np.ndarray, vitorias: np.ndarray, reembolsos: Optional[np.ndarray] = None) -> np.ndarray:
+    """Lucro por R$ 1 de stake de cada mercado em cada cenário (mercados × cenários): odd·W + R − 1"""
+    return liquidar(np.eye(len(odds)), odds, vitorias, reembolsos) - 1.0
+
+def calcular_lucros_carteiras(stakes: np.ndarray, odds: np.ndarray, mercados: Optional[Tuple[str, ...]] = None,
+                              max_gols: int = MAX_GOLS_GRADE) -> np.ndarray:
+    """Lucro (carteiras × cenários) de um lote de alocações (carteiras × mercados) num único produto matricial"""
+    if mercados is None:
+        mercados = tuple(bet_type.value for bet_type in BetType)
+    stakes = np.atleast_2d(np.asarray(stakes, dtype=float))
+    retornos = liquidar(stakes, np.asarray(odds, dtype=float), construir_matriz_indicadora(tuple(mercados), max_gols),
+                        construir_matriz_reembolso(tuple(mercados), max_gols))
+    return retornos - stakes.sum(axis=1, keepdims=True)
+
+# =============================================
+# 🎲 PROBABILIDADES DE PLACARES E MÉTRICAS DE RISCO
+# =============================================
+
+# Nível de confiança padrão do VaR/CVaR
+NIVEL_CONFIANCA_RISCO = 0.95
+
+# Correção Dixon–Coles dos placares baixos (ρ < 0 aumenta 0x0 e 1x1, reduz 1x0 e 0x1); 0 = Poisson independente
+RHO_DIXON_COLES = -0.10
+
+def lambdas_estatisticas(estatisticas) -> Tuple[float, float]:
+    """Gols esperados (favorito, azarão) a partir das médias dos últimos 5 jogos - ataque próprio e defesa adversária
+
+    Aceita um dict de uma partida ou um DataFrame com uma partida por linha (devolve arrays).
+    'lambda_favorito'/'lambda_azarao' (ratings ajustados) têm precedência sobre as médias."""
+    if 'lambda_favorito' in estatisticas and 'lambda_azarao' in estatisticas:
+        lambda_fav, lambda_aza = estatisticas['lambda_favorito'], estatisticas['lambda_azarao']
+        if np.ndim(lambda_fav) == 0:
+            return max(lambda_fav, 0.05), max(lambda_aza, 0.05)
+        return np.maximum(np.asarray(lambda_fav, dtype=float), 0.05), np.maximum(np.asarray(lambda_aza, dtype=float), 0.05)
+    lambda_fav = (estatisticas.get('gols_feitos_favorito', 8) + estatisticas.get('gols_sofridos_azarao', 10)) / 10
+    lambda_aza = (estatisticas.get('gols_feitos_azarao', 4) + estatisticas.get('gols_sofridos_favorito', 3)) / 10
+    if np.ndim(lambda_fav) == 0:
+        return max(lambda_fav, 0.05), max(lambda_aza, 0.05)
+    return np.maximum(np.asarray(lambda_fav, dtype=float), 0.05), np.maximum(np.asarray(lambda_aza, dtype=float), 0.05)
+
+def distribuicao_poisson(lambda_gols, max_gols: int = MAX_GOLS_GRADE) -> np.ndarray:
+    """P(0..max_gols gols) de uma Poisson - o último eixo são os gols, os anteriores seguem lambda_gols"""
+    lambda_gols = np.asarray(lambda_gols, dtype=float)[..., None]
+    k = np.arange(max_gols + 1)
+    fatoriais = np.concatenate(([1.0], np.cumprod(k[1:], dtype=float)))
+    return np.exp(-lambda_gols) * lambda_gols ** k / fatoriais
+
+def matriz_placares_poisson(lambda_fav, lambda_aza, max_gols: int = MAX_GOLS_GRADE, rho: float = 0.0) -> np.ndarray:
+    """Matriz de probabilidades de placares (favorito × azarão), com correção Dixon–Coles opcional, renormalizada na grade
+
+    Com arrays de lambdas devolve uma matriz por partida (partidas × gols favorito × gols azarão)."""
+    lambda_fav = np.asarray(lambda_fav, dtype=float)
+    lambda_aza = np.asarray(lambda_aza, dtype=float)
+    matriz = distribuicao_poisson(lambda_fav, max_gols)[..., :, None] * distribuicao_poisson(lambda_aza, max_gols)[..., None, :]
+    if rho:
+        # τ(h, a) só altera os placares 0x0, 0x1, 1x0 e 1x1
+        rho = np.clip(rho, np.maximum(-1 / lambda_fav, -1 / lambda_aza), np.minimum(1 / (lambda_fav * lambda_aza), 1.0))
+        matriz[..., 0, 0] *= 1 - lambda_fav * lambda_aza * rho
+        matriz[..., 0, 1] *= 1 + lambda_fav * rho
+        matriz[..., 1, 0] *= 1 + lambda_aza * rho
+        matriz[..., 1, 1] *= 1 - rho
+    return matriz / matriz.sum(axis=(-2, -1), keepdims=True)
+
+def probabilidades_cenarios(prob_placares: np.ndarray) -> np.ndarray:
+    """Probabilidades na ordem da matriz de payoff (último eixo): o primeiro gol é dividido na proporção h/(h + a)"""
+    max_gols = prob_placares.shape[-1] - 1
+    h, a = np.meshgrid(np.arange(max_gols + 1), np.arange(max_gols + 1), indexing='ij')
+    total = np.maximum(h + a, 1)
+    
+    probabilidades = np.zeros(prob_placares.shape + (len(PRIMEIRO_GOL_INDICE),))
+    probabilidades[..., PRIMEIRO_GOL_INDICE[None]] = np.where(h + a == 0, prob_placares, 0.0)
+    probabilidades[..., PRIMEIRO_GOL_INDICE[True]] = prob_placares * h / total
+    probabilidades[..., PRIMEIRO_GOL_INDICE[False]] = prob_placares * a / total
+    return probabilidades.reshape(prob_placares.shape[:-2] + (-1,))
+
+# Colunas de odds na rodada: "odd <mercado>", ex.: "odd Vitória Favorito"
+PREFIXO_ODD_RODADA = "odd "
+
+def calcular_probabilidades_rodada(partidas: pd.DataFrame, rho: float = RHO_DIXON_COLES,
+                                   metodo_margem: str = METODO_REMOCAO_MARGEM) -> pd.DataFrame:
+    """Probabilidades (%) de todos os mercados do registro para uma rodada inteira (uma partida por linha)
+
+    As colunas de entrada são as mesmas chaves de estatísticas da análise de valor; faltantes usam os padrões.
+    Com colunas "odd <mercado>", acrescenta a probabilidade justa (livro canônico), a vantagem do modelo e a margem."""
+    # Sem nenhuma coluna de estatísticas os lambdas saem escalares - um par por partida
+    lambda_fav, lambda_aza = (np.broadcast_to(lambda_gols, len(partidas)) for lambda_gols in lambdas_estatisticas(partidas))
+    prob_placares = matriz_placares_poisson(lambda_fav, lambda_aza, rho=rho)
+    prob_mercados = probabilidades_cenarios(prob_placares) @ MASCARAS_MERCADOS.T * 100
+    
+    tabela = pd.DataFrame(prob_mercados, index=partidas.index, columns=list(REGISTRO_MERCADOS))
+    
+    colunas_odds = {coluna: coluna[len(PREFIXO_ODD_RODADA):] for coluna in partidas.columns
+                    if coluna.startswith(PREFIXO_ODD_RODADA) and coluna[len(PREFIXO_ODD_RODADA):] in REGISTRO_MERCADOS}
+    if colunas_odds:
+        justas, margens = remover_margem_rodada(partidas[list(colunas_odds)].rename(columns=colunas_odds), metodo_margem)
+        tabela = pd.concat([
+            tabela,
+            justas.add_suffix(" (justa)"),
+            (tabela[justas.columns] - justas).add_suffix(" (vantagem)"),
+            margens.add_prefix("Margem "),
+        ], axis=1)
+    return tabela
+
+def calcular_metricas_risco(lucros: np.ndarray, prob_cenarios: np.ndarray,
+                            nivel: float = NIVEL_CONFIANCA_RISCO) -> Dict[str, np.ndarray]:
+    """EV, desvio padrão, P(lucro), VaR e CVaR exatos de cada carteira (linhas de lucros) numa redução vetorizada"""
+    lucros = np.atleast_2d(lucros)
+    ev = lucros @ prob_cenarios
+    variancia = np.maximum((lucros ** 2) @ prob_cenarios - ev ** 2, 0.0)
+    prob_lucro = (lucros > TOLERANCIA_EQUILIBRIO) @ prob_cenarios
+    
+    # Cauda de (1 - nível): cenários ordenados do pior para o melhor em cada carteira
+    cauda = 1.0 - nivel
+    ordem = np.argsort(lucros, axis=1)
+    lucros_ordenados = np.take_along_axis(lucros, ordem, axis=1)
+    prob_ordenadas = prob_cenarios[ordem]
+    acumulada = np.cumsum(prob_ordenadas, axis=1)
+    indice_var = np.argmax(acumulada >= cauda - 1e-12, axis=1)
+    peso_cauda = np.clip(cauda - (acumulada - prob_ordenadas), 0.0, prob_ordenadas)
+    
+    return {
+        'ev': ev,
+        'desvio_padrao': np.sqrt(variancia),
+        'prob_lucro': prob_lucro,
+        'var': -lucros_ordenados[np.arange(len(lucros)), indice_var],
+        'cvar': -(peso_cauda * lucros_ordenados).sum(axis=1) / cauda,
+    }
+
+def resolver_kelly(coeficientes: np.ndarray, prob_cenarios: np.ndarray, inicial: Optional[np.ndarray] = None) -> np.ndarray:
+    """Frações do bankroll que maximizam E[log(riqueza)] sobre a distribuição conjunta de cenários (SLSQP)
+
+    coeficientes = odd·W + R − 1 (mercados × cenários): todos os mercados liquidam no mesmo placar, então a
+    correlação entre eles entra direto na riqueza 1 + f·c de cada cenário."""
+    from scipy.optimize import minimize
+    
+    relevantes = prob_cenarios > 0
+    c, p = coeficientes[:, relevantes], prob_cenarios[relevantes]
+    n = c.shape[0]
+    
+    def objetivo(f):
+        riqueza = np.maximum(1.0 + f @ c, 1e-12)
+        return -p @ np.log(riqueza), -c @ (p / riqueza)
+    
+    if inicial is None or len(inicial) != n:
+        # Partida fria: só os mercados de EV positivo, com uma fração pequena
+        inicial = np.where(c @ p > 0, 0.01, 0.0)
+    resultado = minimize(
+        objetivo, np.clip(inicial, 0.0, 1.0), jac=True, method='SLSQP', bounds=[(0.0, 1.0)] * n,
+        constraints=[{'type': 'ineq', 'fun': lambda f: 1.0 - f.sum(), 'jac': lambda f: -np.ones(n)}],
+        options={'ftol': 1e-10, 'maxiter': 200},
+    )
+    return np.maximum(resultado.x, 0.0)
+
+def gerar_fronteira_eficiente(coeficientes: np.ndarray, prob_cenarios: np.ndarray, bankroll: float,
+                              aversoes: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """Fronteira média–variância: max μ·x − γ·xᵀΣx (x = frações do bankroll, x ≥ 0, Σx ≤ 1) para cada aversão γ
+
+    A varredura vai da maior para a menor aversão e cada ponto parte da solução anterior (SLSQP)."""
+    from scipy.optimize import minimize
+    
+    aversoes = np.logspace(3, -2, 100) if aversoes is None else np.sort(np.asarray(aversoes, dtype=float))[::-1]
+    media = coeficientes @ prob_cenarios
+    centrados = coeficientes - media[:, None]
+    covariancia = (centrados * prob_cenarios) @ centrados.T
+    n = len(media)
+    restricoes = [{'type': 'ineq', 'fun': lambda x: 1.0 - x.sum(), 'jac': lambda x: -np.ones(n)}]
+    
+    fracoes = np.zeros((len(aversoes), n))
+    x = np.zeros(n)
+    for i, gama in enumerate(aversoes):
+        def objetivo(x, gama=gama):
+            covariancia_x = covariancia @ x
+            return gama * x @ covariancia_x - media @ x, 2 * gama * covariancia_x - media
+        x = minimize(objetivo, x, jac=True, method='SLSQP', bounds=[(0.0, 1.0)] * n,
+                     constraints=restricoes, options={'ftol': 1e-12, 'maxiter': 200}).x
+        fracoes[i] = x = np.maximum(x, 0.0)
+    
+    stakes = fracoes * bankroll
+    risco = calcular_metricas_risco(stakes @ coeficientes, prob_cenarios)
+    return {
+        'aversao': aversoes,
+        'retorno': risco['ev'],
+        'risco': risco['desvio_padrao'],
+        'cvar': risco['cvar'],
+        'prob_lucro': risco['prob_lucro'],
+        'stakes': stakes,
+    }
+
+# =============================================
+# 🌊 VARREDURAS EM LOTES (MEMÓRIA LIMITADA)
+# =============================================
+
+# Carteiras avaliadas por lote nas varreduras - o pico de memória é lote × cenários
+TAMANHO_LOTE_PADRAO = 2048
+
+# Classes do histograma das varreduras e desvios-padrão da oscilação cobertos pelas bordas
+CLASSES_HISTOGRAMA = 40
+DESVIOS_LIMITE_ODDS = 4.0
+
+class RedutorCorrente:
+    """Acumula mínimo, máximo, média por cenário e histograma global de lotes de lucros (carteiras × cenários)"""
+    
+    def __init__(self, n_cenarios: int, bordas_histograma: np.ndarray):
+        self.bordas = np.asarray(bordas_histograma, dtype=float)
+        self.minimo = np.full(n_cenarios, np.inf)
+        self.maximo = np.full(n_cenarios, -np.inf)
+        self.soma = np.zeros(n_cenarios)
+        self.histograma = np.zeros(len(self.bordas) - 1, dtype=np.int64)
+        self.carteiras = 0
+    
+    def acumular(self, lucros: np.ndarray):
+        lucros = np.atleast_2d(lucros)
+        np.minimum(self.minimo, lucros.min(axis=0), out=self.minimo)
+        np.maximum(self.maximo, lucros.max(axis=0), out=self.maximo)
+        self.soma += lucros.sum(axis=0)
+        # Valores fora das bordas entram nas classes extremas
+        self.histograma += np.histogram(np.clip(lucros, self.bordas[0], self.bordas[-1]), self.bordas)[0]
+        self.carteiras += len(lucros)
+    
+    def resultado(self) -> Dict[str, np.ndarray]:
+        return {
+            'lucro_min': self.minimo,
+            'lucro_max': self.maximo,
+            'lucro_medio': self.soma / max(self.carteiras, 1),
+            'histograma': self.histograma,
+            'bordas': self.bordas,
+            'carteiras': self.carteiras,
+        }
+
+def lotes_perturbacao_odds(stakes: np.ndarray, odds: np.ndarray, n_amostras: int, desvio_relativo: float = 0.05,
+                           tamanho_lote: int = TAMANHO_LOTE_PADRAO, semente: int = 0) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Gera lotes (stakes, odds perturbadas log-normalmente) sob demanda, sem materializar a varredura inteira"""
+    gerador = np.random.default_rng(semente)
+    stakes = np.asarray(stakes, dtype=float)
+    odds = np.asarray(odds, dtype=float)
+    for inicio in range(0, n_amostras, tamanho_lote):
+        n = min(tamanho_lote, n_amostras - inicio)
+        perturbadas = np.maximum(odds * np.exp(gerador.normal(0.0, desvio_relativo, (n, len(odds)))), 1.01)
+        yield np.broadcast_to(stakes, perturbadas.shape), perturbadas
+
+def limites_perturbacao_odds(stakes: np.ndarray, odds: np.ndarray, mercados: Tuple[str, ...], desvio_relativo: float = 0.05,
+                             max_gols: int = MAX_GOLS_GRADE, desvios: float = DESVIOS_LIMITE_ODDS) -> Tuple[float, float]:
+    """Menor e maior lucro da varredura de odds com as odds a ±desvios·σ - dois cantos da caixa, sem varrer
+
+    Com stakes ≥ 0 o lucro cresce com cada odd (odd·W, W ≥ 0): o mínimo está no canto das odds baixas e o máximo no das altas,
+    o mesmo argumento de canto de buscar_extremos_garantidos."""
+    odds = np.asarray(odds, dtype=float)
+    cantos = np.maximum(odds * np.exp(np.array([[-desvios], [desvios]]) * desvio_relativo), 1.01)
+    lucros = calcular_lucros_carteiras(np.broadcast_to(stakes, cantos.shape), cantos, mercados, max_gols)
+    return float(lucros[0].min()), float(lucros[1].max())
+
+def varrer_carteiras_em_lotes(lotes: Iterable[Tuple[np.ndarray, np.ndarray]], mercados: Tuple[str, ...],
+                              max_gols: int = MAX_GOLS_GRADE, bordas_histograma: Optional[np.ndarray] = None,
+                              limites_lucro: Optional[Tuple[float, float]] = None) -> Dict:
+    """Avalia uma varredura de carteiras (stakes e odds por linha) lote a lote, dobrando cada lote nos redutores
+
+    Sem bordas explícitas, o histograma cobre limites_lucro (ex.: limites_perturbacao_odds) em CLASSES_HISTOGRAMA classes."""
+    if bordas_histograma is None:
+        minimo, maximo = (-50.0, 50.0) if limites_lucro is None else limites_lucro
+        if maximo <= minimo:
+            minimo, maximo = minimo - 1.0, maximo + 1.0
+        bordas_histograma = np.linspace(minimo, maximo, CLASSES_HISTOGRAMA + 1)
+    redutor = RedutorCorrente(construir_matriz_indicadora(tuple(mercados), max_gols).shape[1], bordas_histograma)
+    for stakes, odds in lotes:
+        redutor.acumular(calcular_lucros_carteiras(stakes, odds, mercados, max_gols))
+    return redutor.resultado()
+
 # =============================================
 # 🎯 ANÁLISE DE CENÁRIOS ATUALIZADA
 # =============================================
 
+class BetView:
+    """Mercado da carteira (analyzer.mercados[nome]): visão somente-leitura dos arrays com a interface do antigo Bet
+
+    bet_type é None nos mercados de linha gerados no registro."""
+    __slots__ = ('nome', '_carteira', '_posicao')
+    
+    def __init__(self, nome: str, carteira: 'BettingStrategyAnalyzer', posicao: int):
+        self.nome = nome
+        self._carteira = carteira
+        self._posicao = posicao
+    
+    @property
+    def bet_type(self) -> Optional[BetType]:
+        return BET_TYPE_POR_NOME.get(self.nome)
+    
+    @property
+    def investment(self) -> float:
+        return float(self._carteira._stakes[self._posicao])
+    
+    @property
+    def odds(self) -> float:
+        return float(self._carteira._odds[self._posicao])
+    
+    @property
+    def potential_return(self) -> float:
+        return self.investment * self.odds
+    
+    @property
+    def implied_probability(self) -> float:
+        return (1 / self.odds) * 100 if self.odds > 0 else 0
+
 class BettingStrategyAnalyzer:
     def __init__(self):
-        self.bets: Dict[BetType, Bet] = {}
+        # Carteira em arrays contíguos: posição de cada mercado (pelo nome, estável entre reruns) → stake/odd
+        self._indices: Dict[str, int] = {}
+        self._stakes = np.zeros(0)
+        self._odds = np.zeros(0)
+        self._matrizes: Dict[int, np.ndarray] = {}
+        self._reembolsos: Dict[int, Optional[np.ndarray]] = {}
+        self._retornos: Dict[int, np.ndarray] = {}
+        # Produtos matriciais completos feitos - edições de stake/odd em mercados existentes não devem aumentá-lo
+        self.reconstrucoes_retornos = 0
+
+    @property
+    def bets(self) -> Dict[BetType, BetView]:
+        """Apostas nos mercados principais (BetType)"""
+        return {BET_TYPE_POR_NOME[nome]: BetView(nome, self, posicao)
+                for nome, posicao in self._indices.items() if nome in BET_TYPE_POR_NOME}
+
+    @property
+    def mercados(self) -> Dict[str, BetView]:
+        """Todas as apostas, incluindo mercados de linha do registro, indexadas pelo nome"""
+        return {nome: BetView(nome, self, posicao) for nome, posicao in self._indices.items()}
+
+    @property
+    def nomes(self) -> List[str]:
+        return list(self._indices)
+
+    @property
+    def stakes(self) -> np.ndarray:
+        """Stakes na ordem das linhas da matriz (somente leitura)"""
+        stakes = self._stakes.view()
+        stakes.setflags(write=False)
+        return stakes
+
+    @property
+    def odds(self) -> np.ndarray:
+        """Odds na ordem das linhas da matriz (somente leitura)"""
+        odds = self._odds.view()
+        odds.setflags(write=False)
+        return odds
         
     def update_bet(self, bet_type: BetType, investment: float, odds: float):
-        self.bets[bet_type] = Bet(bet_type, investment, odds)
+        """Atualiza um mercado principal aplicando só o delta da sua contribuição"""
+        self.update_market(bet_type.value, investment, odds)
+
+    def update_market(self, nome: str, investment: float, odds: float):
+        """Atualiza qualquer mercado do registro aplicando só o delta da sua contribuição - O(cenários) por campo alterado"""
+        if nome not in REGISTRO_MERCADOS:
+            raise KeyError(f"Mercado não registrado: {nome}")
+        linha = self._indices.get(nome)
+        
+        if linha is None:
+            # Novo mercado muda as linhas da matriz: vetores em cache são reconstruídos sob demanda
+            self._indices[nome] = len(self._indices)
+            self._stakes = np.append(self._stakes, float(investment))
+            self._odds = np.append(self._odds, float(odds))
+            self._matrizes.clear()
+            self._reembolsos.clear()
+            self._retornos.clear()
+            return
+        
+        stake_anterior, odd_anterior = self._stakes[linha], self._odds[linha]
+        if stake_anterior == investment and odd_anterior == odds:
+            return
+        
+        delta_retorno = investment * odds - stake_anterior * odd_anterior
+        delta_stake = investment - stake_anterior
+        self._stakes[linha] = investment
+        self._odds[linha] = odds
+        for max_gols, retornos in self._retornos.items():
+            retornos += delta_retorno * self._matrizes[max_gols][linha]
+            if self._reembolsos[max_gols] is not None:
+                retornos += delta_stake * self._reembolsos[max_gols][linha]
 
     def get_total_investment(self) -> float:
-        return sum(bet.investment for bet in self.bets.values())
+        return float(self._stakes.sum())
+
+    def copy(self) -> 'BettingStrategyAnalyzer':
+        """Cópia independente para cache (arrays copiados, matrizes somente-leitura compartilhadas)"""
+        novo = copy.copy(self)
+        novo._indices = dict(self._indices)
+        novo._stakes = self._stakes.copy()
+        novo._odds = self._odds.copy()
+        novo._matrizes = dict(self._matrizes)
+        novo._reembolsos = dict(self._reembolsos)
+        novo._retornos = {max_gols: retornos.copy() for max_gols, retornos in self._retornos.items()}
+        return novo
+
+    def _matriz_indicadora(self, max_gols: int) -> np.ndarray:
+        if max_gols not in self._matrizes:
+            self._matrizes[max_gols] = construir_matriz_indicadora(tuple(self._indices), max_gols)
+        return self._matrizes[max_gols]
+
+    def _matriz_reembolso(self, max_gols: int) -> Optional[np.ndarray]:
+        if max_gols not in self._reembolsos:
+            self._reembolsos[max_gols] = construir_matriz_reembolso(tuple(self._indices), max_gols)
+        return self._reembolsos[max_gols]
+
+    def scenario_returns(self, max_gols: int = MAX_GOLS_GRADE) -> np.ndarray:
+        """Retorno bruto de todos os cenários: stake·(odds·vitória + reembolso) num único produto matricial"""
+        if max_gols not in self._retornos:
+            self.reconstrucoes_retornos += 1
+            self._retornos[max_gols] = liquidar(self._stakes, self._odds, self._matriz_indicadora(max_gols),
+                                                self._matriz_reembolso(max_gols))
+        return self._retornos[max_gols]
+
+    def calculate_scenarios(self, scenarios: List[Tuple[int, int, Optional[bool]]]) -> List[Dict[str, any]]:
+        """Avalia vários cenários (casa, fora, primeiro gol do favorito) com uma única consulta vetorizada"""
+        if not scenarios:
+            return []
         
-    def calculate_scenario_profit(self, home_goals: int, away_goals: int, first_goal_by_fav: bool = None) -> Dict[str, any]:
-        total_goals = home_goals + away_goals
-        both_scored = home_goals > 0 and away_goals > 0
+        max_gols = max(MAX_GOLS_GRADE, max(max(h, a) for h, a, _ in scenarios))
+        indices = np.array([indice_cenario(h, a, first, max_gols) for h, a, first in scenarios])
         total_investment_all = self.get_total_investment()
-        total_return = 0.0
-        winning_bets = []
-        
-        for bet_type, bet in self.bets.items():
-            wins = False
-            if bet_type == BetType.EXACT_0_0:
-                wins = (home_goals == 0 and away_goals == 0)
-            elif bet_type == BetType.EXACT_1_0:  # 🔥 NOVA CONDIÇÃO
-                wins = (home_goals == 1 and away_goals == 0)
-            elif bet_type == BetType.UNDER_15:
-                wins = (total_goals < 1.5)
-            elif bet_type == BetType.OVER_05_AZARAO:
-                wins = away_goals > 0.5
-            elif bet_type == BetType.NEXT_GOAL_FAV and first_goal_by_fav is not None:
-                wins = first_goal_by_fav
-            elif bet_type == BetType.VITORIA_FAV:
-                wins = home_goals > away_goals
-            elif bet_type == BetType.DOUBLE_CHANCE_X2:
-                wins = (home_goals == away_goals) or (away_goals > home_goals)
-            elif bet_type == BetType.OVER_15:
-                wins = total_goals > 1.5
-            elif bet_type == BetType.EXACT_1_1:
-                wins = (home_goals == 1 and away_goals == 1)
-            elif bet_type == BetType.OVER_15_BOTH_NO:
-                wins = (total_goals > 1.5) and not both_scored
-            elif bet_type == BetType.UNDER_25_DC_1X:
-                wins = (total_goals < 2.5) and (home_goals >= away_goals)
-            elif bet_type == BetType.OVER_25_DC_12:
-                wins = (total_goals > 2.5) and (home_goals != away_goals)
-                    
-            if wins:
-                total_return += bet.potential_return
-                winning_bets.append(bet_type.value)
         
-        profit = total_return - total_investment_all
+        retornos = self.scenario_returns(max_gols)[indices]
+        vencedoras = self._matriz_indicadora(max_gols)[:, indices].T.astype(bool)
+        nomes = np.array(self.nomes, dtype=object)
         
+        resultados = []
+        for total_return, vence in zip(retornos.tolist(), vencedoras):
+            profit = total_return - total_investment_all
+            resultados.append({
+                'Retorno Total': total_return,
+                'Investimento Total': total_investment_all,
+                'Lucro/Prejuízo': profit,
+                'Apostas Vencedoras': nomes[vence].tolist(),
+                'Status': '✅ Lucro' if profit > TOLERANCIA_EQUILIBRIO else '❌ Prejuízo' if profit < -TOLERANCIA_EQUILIBRIO else '⚖️ Equilíbrio',
+                'ROI': (profit / total_investment_all * 100) if total_investment_all > 0 else 0
+            })
+        
+        return resultados
+        
+    def calculate_scenario_profit(self, home_goals: int, away_goals: int, first_goal_by_fav: bool = None) -> Dict[str, any]:
+        return self.calculate_scenarios([(home_goals, away_goals, first_goal_by_fav)])[0]
+
+    def calculate_portfolio_profits(self, stakes: np.ndarray, odds: Optional[np.ndarray] = None,
+                                    max_goals: int = MAX_GOLS_GRADE) -> np.ndarray:
+        """Lucro (carteiras × cenários) de um lote de alocações nos mercados deste analisador"""
+        return calcular_lucros_carteiras(stakes, self._odds if odds is None else odds, tuple(self._indices), max_goals)
+
+    def scenario_sensitivities(self, max_gols: int = MAX_GOLS_GRADE) -> Dict[str, np.ndarray]:
+        """Jacobiano exato do lucro por cenário (mercados × cenários): ∂/∂odd = stake·W, ∂/∂stake = odd·W + R − 1"""
+        vitorias = self._matriz_indicadora(max_gols)
         return {
-            'Retorno Total': total_return,
-            'Investimento Total': total_investment_all,
-            'Lucro/Prejuízo': profit,
-            'Apostas Vencedoras': winning_bets,
-            'Status': '✅ Lucro' if profit > 0 else '❌ Prejuízo' if profit < 0 else '⚖️ Equilíbrio',
-            'ROI': (profit / total_investment_all * 100) if total_investment_all > 0 else 0
+            'mercados': np.array(self.nomes, dtype=object),
+            'odds': self._stakes[:, None] * vitorias,
+            'stakes': coeficientes_liquidacao(self._odds, vitorias, self._matriz_reembolso(max_gols)),
         }
 
+    def break_even_odds(self, max_gols: int = MAX_GOLS_GRADE) -> np.ndarray:
+        """Odd mínima de cada mercado para zerar o lucro de cada cenário (mercados × cenários): o − lucro / (stake·W)
+
+        NaN onde a odd do mercado não afeta o cenário (stake zero ou aposta perdida). Limitada a ODD_EQUILIBRIO_COBERTO:
+        1.0 marca cenário coberto a qualquer odd (o lucro dos outros mercados já paga a stake)."""
+        lucros = self.scenario_returns(max_gols) - self.get_total_investment()
+        d_odds = self.scenario_sensitivities(max_gols)['odds']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(d_odds > 0, np.maximum(self._odds[:, None] - lucros / d_odds, ODD_EQUILIBRIO_COBERTO), np.nan)
+
+    def calculate_profit_grid(self, max_goals: int = MAX_GOLS_GRADE, first_goal_axis: bool = False,
+                              reducao: str = 'min') -> np.ndarray:
+        """Lucro/prejuízo de todos os placares até max_goals × max_goals (linhas = favorito, colunas = azarão)
+
+        Sem o eixo do primeiro gol, cada placar reduz ('min' = pior caso, 'max' ou 'mean') só os primeiros gols
+        possíveis: Nx0 é sempre do favorito, 0xN do azarão, 0x0 não tem primeiro gol e NxM considera os dois."""
+        grade = (self.scenario_returns(max_goals) - self.get_total_investment()).reshape(
+            max_goals + 1, max_goals + 1, len(PRIMEIRO_GOL_INDICE)
+        )
+        
+        if not first_goal_axis:
+            reais = mascara_cenarios_reais(max_goals).reshape(grade.shape)
+            return REDUCOES_PRIMEIRO_GOL[reducao](np.where(reais, grade, np.nan), axis=2)
+        
+        # Eixo do primeiro gol: combinações impossíveis (ex.: favorito marcou primeiro em 0xN) ficam como NaN
+        grade = grade.copy()
+        grade[0, :, PRIMEIRO_GOL_INDICE[True]] = np.nan
+        grade[:, 0, PRIMEIRO_GOL_INDICE[False]] = np.nan
+        return grade
+
+# =============================================
+# 🧠 CACHE DE RESULTADOS ENTRE RERUNS
+# =============================================
+
+def impressao_digital(*entradas) -> str:
+    """Hash estável das entradas (dicts de odds/investimentos, estatísticas, parâmetros)"""
+    hash_entradas = hashlib.blake2b(digest_size=16)
+    for entrada in entradas:
+        if isinstance(entrada, dict):
+            chaves = sorted(entrada)
+            hash_entradas.update("\x1f".join(map(str, chaves)).encode("utf-8"))
+            valores = [entrada[chave] for chave in chaves]
+            if all(isinstance(valor, (int, float)) for valor in valores):
+                hash_entradas.update(np.asarray(valores, dtype=np.float64).tobytes())
+            else:
+                hash_entradas.update(repr(valores).encode("utf-8"))
+        else:
+            hash_entradas.update(repr(entrada).encode("utf-8"))
+        hash_entradas.update(b"\x1e")
+    return hash_entradas.hexdigest()
+
+class CacheResultados:
+    """Cache LRU de resultados por impressão digital da carteira (odds, investimentos)"""
+    
+    def __init__(self, capacidade: int = 32):
+        self.capacidade = capacidade
+        self._entradas: OrderedDict = OrderedDict()
+    
+    def obter(self, chave: str, secao: str):
+        entrada = self._entradas.get(chave)
+        if entrada is None or secao not in entrada:
+            return None
+        self._entradas.move_to_end(chave)
+        return entrada[secao]
+    
+    def guardar(self, chave: str, secao: str, valor):
+        self._entradas.setdefault(chave, {})[secao] = valor
+        self._entradas.move_to_end(chave)
+        while len(self._entradas) > self.capacidade:
+            self._entradas.popitem(last=False)
+        return valor
+    
+    def obter_ou_calcular(self, chave: str, secao: str, calcular):
+        valor = self.obter(chave, secao)
+        if valor is None:
+            valor = self.guardar(chave, secao, calcular())
+        return valor
+
+def get_cache_resultados() -> CacheResultados:
+    """Cache de resultados da sessão (sobrevive aos reruns do Streamlit)"""
+    app_state = st.session_state.app_state
+    if 'cache_resultados' not in app_state:
+        app_state['cache_resultados'] = CacheResultados()
+    return app_state['cache_resultados']
+
+def chave_carteira() -> str:
+    """Impressão digital da carteira atual (odds, investimentos e mercados de linha)"""
+    app_state = st.session_state.app_state
+    return impressao_digital(app_state['odds_values'], app_state['investment_values'], app_state.get('mercados_linha', {}))
+
 def get_analyzer() -> BettingStrategyAnalyzer:
-    analyzer = BettingStrategyAnalyzer()
+    """Analisador da carteira atual - cache por impressão digital, com atualização incremental nos misses"""
+    app_state = st.session_state.app_state
+    cache = get_cache_resultados()
+    chave = chave_carteira()
+    
+    cached = cache.obter(chave, 'analyzer')
+    if cached is not None:
+        return cached
+    
+    # Analisador persistente na sessão - aplica apenas os campos de odds/investimento alterados
+    analyzer = app_state.get('analyzer')
+    if analyzer is None:
+        analyzer = BettingStrategyAnalyzer()
+        app_state['analyzer'] = analyzer
+    
     for bet_type in BetType:
         analyzer.update_bet(
             bet_type,
-            st.session_state.app_state['investment_values'][bet_type.value],
-            st.session_state.app_state['odds_values'][bet_type.value]
+            app_state['investment_values'][bet_type.value],
+            app_state['odds_values'][bet_type.value]
+        )
+    
+    # Mercados de linha: removidos da carteira ficam com stake zero (as linhas da matriz são mantidas)
+    mercados_linha = app_state.get('mercados_linha', {})
+    for nome, bet in analyzer.mercados.items():
+        if nome not in BET_TYPE_POR_NOME and nome not in mercados_linha:
+            analyzer.update_market(nome, 0.0, bet.odds)
+    for nome, valores in mercados_linha.items():
+        analyzer.update_market(nome, valores['investment'], valores['odds'])
+    
+    # Vetores de cenários aquecidos no analisador persistente: as próximas edições só aplicam o delta
+    analyzer.scenario_returns()
+    return cache.guardar(chave, 'analyzer', analyzer.copy())
+
+# =============================================
+# 🔀 MOTOR DE SEQUÊNCIAS DE GOLS (MERCADOS DEPENDENTES DA ORDEM)
+# =============================================
+
+# Último a marcar: 0 = ninguém ainda, 1 = favorito, 2 = azarão
+ULTIMO_GOL_INDICE = {None: 0, 'FAV': 1, 'AZA': 2}
+
+@dataclass
+class NextGoalPosition:
+    """Aposta de 'próximo gol' aberta quando o jogo passa por um placar"""
+    score: Tuple[int, int]
+    team: str  # 'FAV' ou 'AZA'
+    investment: float
+    odds: float
+    after_goal_by: Optional[str] = None  # exige que o último gol antes do placar seja deste time
+
+class GoalSequenceAnalyzer:
+    """Programação dinâmica sobre estados (gols favorito, gols azarão, último a marcar)"""
+    
+    def __init__(self, analyzer: BettingStrategyAnalyzer, positions: Optional[List[NextGoalPosition]] = None):
+        self.analyzer = analyzer
+        self.positions = list(positions or [])
+        
+        # A aposta pré-jogo 'Próximo Gol Favorito' é uma posição de próximo gol aberta em 0x0
+        next_goal_bet = analyzer.mercados.get(BetType.NEXT_GOAL_FAV.value)
+        self._stake_proximo_gol_pre_jogo = next_goal_bet.investment if next_goal_bet else 0.0
+        if self._stake_proximo_gol_pre_jogo > 0:
+            self.positions.append(NextGoalPosition((0, 0), 'FAV', next_goal_bet.investment, next_goal_bet.odds))
+    
+    def _tabelas_posicoes(self, max_goals: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Custo de abertura por estado e retorno por transição (estado, time que marca)"""
+        tamanho = max_goals + 2
+        abertura = np.zeros((tamanho, tamanho, len(ULTIMO_GOL_INDICE)))
+        retorno = np.zeros((tamanho, tamanho, len(ULTIMO_GOL_INDICE), len(ULTIMO_GOL_INDICE)))
+        
+        for position in self.positions:
+            h, a = position.score
+            if h + a > max_goals:
+                continue
+            ultimos = [ULTIMO_GOL_INDICE[position.after_goal_by]] if position.after_goal_by else list(ULTIMO_GOL_INDICE.values())
+            abertura[h, a, ultimos] += position.investment
+            retorno[h, a, ultimos, ULTIMO_GOL_INDICE[position.team]] += position.investment * position.odds
+        
+        return abertura, retorno
+    
+    def calculate_sequence_grid(self, max_goals: int = MAX_GOLS_GRADE) -> Dict[str, np.ndarray]:
+        """Lucro mínimo, máximo e médio por placar final sobre todas as ordens de gols (h + a ≤ max_goals)"""
+        tamanho = max_goals + 2
+        fav, aza = ULTIMO_GOL_INDICE['FAV'], ULTIMO_GOL_INDICE['AZA']
+        abertura, retorno = self._tabelas_posicoes(max_goals)
+        
+        # Estado: nº de sequências e P&L acumulado (mín/máx/soma) das posições dependentes da ordem
+        sequencias = np.zeros((tamanho, tamanho, len(ULTIMO_GOL_INDICE)))
+        minimo = np.full(sequencias.shape, np.inf)
+        maximo = np.full(sequencias.shape, -np.inf)
+        soma = np.zeros(sequencias.shape)
+        
+        sequencias[0, 0, 0] = 1
+        minimo[0, 0, 0] = maximo[0, 0, 0] = soma[0, 0, 0] = -abertura[0, 0, 0]
+        
+        for total in range(max_goals):
+            h = np.arange(total + 1)
+            a = total - h
+            n_origem = sequencias[h, a]
+            ativo = n_origem > 0
+            
+            for marcador, destino_h, destino_a in ((fav, h + 1, a), (aza, h, a + 1)):
+                ganho = retorno[h, a, :, marcador]
+                custo = abertura[destino_h, destino_a, marcador]
+                n_destino = n_origem.sum(axis=1)
+                
+                sequencias[destino_h, destino_a, marcador] = n_destino
+                minimo[destino_h, destino_a, marcador] = np.where(ativo, minimo[h, a] + ganho, np.inf).min(axis=1) - custo
+                maximo[destino_h, destino_a, marcador] = np.where(ativo, maximo[h, a] + ganho, -np.inf).max(axis=1) - custo
+                soma[destino_h, destino_a, marcador] = (soma[h, a] + n_origem * ganho).sum(axis=1) - n_destino * custo
+        
+        # Mercados de placar final (sem a aposta de próximo gol pré-jogo, já tratada como posição)
+        base = self._grade_placar_final(max_goals)
+        n_total = sequencias[:max_goals + 1, :max_goals + 1].sum(axis=2)
+        alcancavel = n_total > 0
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return {
+                'sequencias': n_total,
+                'lucro_min': np.where(alcancavel, base + minimo[:max_goals + 1, :max_goals + 1].min(axis=2), np.nan),
+                'lucro_max': np.where(alcancavel, base + maximo[:max_goals + 1, :max_goals + 1].max(axis=2), np.nan),
+                'lucro_medio': np.where(alcancavel, base + soma[:max_goals + 1, :max_goals + 1].sum(axis=2) / n_total, np.nan),
+            }
+    
+    def calculate_sequence_profit(self, sequence: str) -> float:
+        """Lucro exato de uma sequência específica de gols, ex.: 'FAF' (F = favorito, A = azarão)"""
+        h = a = 0
+        ultimo = None
+        lucro = 0.0
+        
+        for marcador in sequence.upper():
+            time = 'FAV' if marcador == 'F' else 'AZA'
+            for position in self._posicoes_abertas(h, a, ultimo):
+                lucro += position.investment * position.odds if position.team == time else 0.0
+            h, a = (h + 1, a) if time == 'FAV' else (h, a + 1)
+            ultimo = time
+            lucro -= sum(position.investment for position in self._posicoes_abertas(h, a, ultimo))
+        
+        lucro -= sum(position.investment for position in self._posicoes_abertas(0, 0, None))
+        return lucro + self._grade_placar_final(max(MAX_GOLS_GRADE, h, a))[h, a]
+    
+    def _grade_placar_final(self, max_goals: int) -> np.ndarray:
+        """Lucro só dos mercados de placar final - fatia sem primeiro gol, com o stake do próximo gol pré-jogo devolvido"""
+        grade = self.analyzer.calculate_profit_grid(max_goals, first_goal_axis=True)
+        return grade[:, :, PRIMEIRO_GOL_INDICE[None]] + self._stake_proximo_gol_pre_jogo
+    
+    def _posicoes_abertas(self, h: int, a: int, ultimo: Optional[str]) -> List[NextGoalPosition]:
+        return [p for p in self.positions
+                if p.score == (h, a) and (p.after_goal_by is None or p.after_goal_by == ultimo)]
+
+# =============================================
+# ⏱️ MOTOR INTERVALO × FINAL (GRADE 4-D)
+# =============================================
+
+# Gols por equipe em cada tempo na grade (1º tempo casa, 1º tempo fora, 2º tempo casa, 2º tempo fora)
+MAX_GOLS_TEMPO = 4
+
+RESULTADOS_TEMPO = {
+    'Favorito': lambda h, a: h > a,
+    'Empate': lambda h, a: h == a,
+    'Azarão': lambda h, a: h < a,
+}
+CODIGOS_RESULTADO = {'Favorito': 'FAV', 'Empate': 'EMP', 'Azarão': 'AZA'}
+LINHAS_GOLS_TEMPO = [0.5, 1.5, 2.5]
+
+REGISTRO_MERCADOS_TEMPOS: Dict[str, MercadoSpec] = {}
+
+def registrar_mercado_tempos(codigo: str, nome: str, liquidacao: Callable, grupo: str) -> MercadoSpec:
+    """Mercado liquidado na grade 4-D - o predicado recebe (1ºT casa, 1ºT fora, 2ºT casa, 2ºT fora)"""
+    if nome in REGISTRO_MERCADOS_TEMPOS:
+        raise ValueError(f"Mercado já registrado: {nome}")
+    spec = MercadoSpec(codigo, nome, liquidacao, grupo=grupo)
+    REGISTRO_MERCADOS_TEMPOS[nome] = spec
+    return spec
+
+for _ht, _resultado_ht in RESULTADOS_TEMPO.items():
+    for _ft, _resultado_ft in RESULTADOS_TEMPO.items():
+        registrar_mercado_tempos(
+            f"HTFT_{CODIGOS_RESULTADO[_ht]}_{CODIGOS_RESULTADO[_ft]}", f"Intervalo/Final {_ht}/{_ft}",
+            lambda hh, ha, sh, sa, _r1=_resultado_ht, _r2=_resultado_ft: _r1(hh, ha) & _r2(hh + sh, ha + sa),
+            "Intervalo/Final"
+        )
+
+for _tempo, _prefixo, _gols in [(1, "1º Tempo", lambda hh, ha, sh, sa: (hh, ha)),
+                                (2, "2º Tempo", lambda hh, ha, sh, sa: (sh, sa))]:
+    for _resultado, _liquidacao in RESULTADOS_TEMPO.items():
+        registrar_mercado_tempos(
+            f"T{_tempo}_{CODIGOS_RESULTADO[_resultado]}", f"{_prefixo} {_resultado}",
+            lambda hh, ha, sh, sa, _g=_gols, _r=_liquidacao: _r(*_g(hh, ha, sh, sa)), _prefixo
         )
-    return analyzer
+    for _linha in LINHAS_GOLS_TEMPO:
+        _codigo = formatar_linha(_linha).replace('.', '_')
+        registrar_mercado_tempos(f"T{_tempo}_OVER_{_codigo}", f"{_prefixo} Mais {formatar_linha(_linha)} Gols",
+                                 lambda hh, ha, sh, sa, _g=_gols, _l=_linha: sum(_g(hh, ha, sh, sa)) > _l, _prefixo)
+        registrar_mercado_tempos(f"T{_tempo}_UNDER_{_codigo}", f"{_prefixo} Menos {formatar_linha(_linha)} Gols",
+                                 lambda hh, ha, sh, sa, _g=_gols, _l=_linha: sum(_g(hh, ha, sh, sa)) < _l, _prefixo)
+
+def grade_tempos(max_gols_tempo: int = MAX_GOLS_TEMPO) -> Tuple[np.ndarray, ...]:
+    """Grades 4-D (1ºT casa, 1ºT fora, 2ºT casa, 2ºT fora)"""
+    eixo = np.arange(max_gols_tempo + 1)
+    return np.meshgrid(eixo, eixo, eixo, eixo, indexing='ij')
+
+@lru_cache(maxsize=8)
+def compilar_mascaras_tempos(mercados: Tuple[str, ...], max_gols_tempo: int = MAX_GOLS_TEMPO) -> np.ndarray:
+    """Matriz (mercados × células da grade 4-D) com 1.0 onde a aposta de tempo vence"""
+    grades = grade_tempos(max_gols_tempo)
+    mascaras = np.zeros((len(mercados), grades[0].size))
+    for i, mercado in enumerate(mercados):
+        mascaras[i] = REGISTRO_MERCADOS_TEMPOS[mercado].liquidacao(*grades).ravel()
+    mascaras.setflags(write=False)
+    return mascaras
+
+class HalfTimeFullTimeAnalyzer:
+    """Grade 4-D 1º tempo × 2º tempo: mercados de placar final somados aos mercados de intervalo e de cada tempo"""
+    
+    def __init__(self, analyzer: BettingStrategyAnalyzer, positions: Optional[Dict[str, Dict[str, float]]] = None):
+        self.analyzer = analyzer
+        self.positions = dict(positions or {})  # nome do mercado → {'investment', 'odds'}
+    
+    def _lucro_final(self, grade_final: np.ndarray, hh, ha, sh, sa) -> np.ndarray:
+        """Lucro dos mercados de placar final com o eixo do primeiro gol - NaN onde a ordem dos gols é impossível
+
+        Quem marcou primeiro sai do 1º tempo quando ele teve gols, senão do 2º tempo."""
+        reais = mascara_cenarios_reais(grade_final.shape[0] - 1).reshape(grade_final.shape)
+        sem_gol_1t = (hh + ha) == 0
+        possivel = reais[np.where(sem_gol_1t, sh, hh), np.where(sem_gol_1t, sa, ha)]
+        return np.where(possivel, grade_final[hh + sh, ha + sa], np.nan)
+    
+    def calculate_ht_ft_grid(self, max_goals_half: int = MAX_GOLS_TEMPO, first_goal_axis: bool = False,
+                             reducao: str = 'min') -> np.ndarray:
+        """Lucro por (1ºT casa, 1ºT fora, 2ºT casa, 2ºT fora) - o placar final é lido da grade do analisador por soma de índices
+
+        Sem o eixo do primeiro gol, reduz ('min', 'max' ou 'mean') as ordens de gols possíveis de cada célula."""
+        hh, ha, sh, sa = grade_tempos(max_goals_half)
+        grade_final = self.analyzer.calculate_profit_grid(2 * max_goals_half, first_goal_axis=True)
+        lucro = self._lucro_final(grade_final, hh, ha, sh, sa)
+        
+        if self.positions:
+            nomes = tuple(self.positions)
+            investimentos = np.array([self.positions[nome]['investment'] for nome in nomes])
+            odds = np.array([self.positions[nome]['odds'] for nome in nomes])
+            lucro_tempos = (investimentos * odds) @ compilar_mascaras_tempos(nomes, max_goals_half) - investimentos.sum()
+            lucro = lucro + lucro_tempos.reshape(lucro.shape[:-1])[..., None]
+        
+        return lucro if first_goal_axis else REDUCOES_PRIMEIRO_GOL[reducao](lucro, axis=-1)
+    
+    def iterate_ht_ft_grid(self, max_goals_half: int = MAX_GOLS_TEMPO,
+                           linhas_por_lote: int = 1) -> Iterator[Tuple[int, np.ndarray]]:
+        """Grade 4-D × primeiro gol em blocos de gols do favorito no 1º tempo - a memória fica limitada ao bloco"""
+        eixo = np.arange(max_goals_half + 1)
+        grade_final = self.analyzer.calculate_profit_grid(2 * max_goals_half, first_goal_axis=True)
+        
+        for inicio in range(0, len(eixo), linhas_por_lote):
+            hh, ha, sh, sa = np.meshgrid(eixo[inicio:inicio + linhas_por_lote], eixo, eixo, eixo, indexing='ij')
+            lucro = self._lucro_final(grade_final, hh, ha, sh, sa)
+            for nome, posicao in self.positions.items():
+                vence = REGISTRO_MERCADOS_TEMPOS[nome].liquidacao(hh, ha, sh, sa)[..., None]
+                lucro += posicao['investment'] * posicao['odds'] * vence - posicao['investment']
+            yield inicio, lucro
+    
+    def halftime_exposure(self, max_goals_half: int = MAX_GOLS_TEMPO, linhas_por_lote: int = 1) -> Dict[str, np.ndarray]:
+        """Exposição por placar do intervalo: pior, melhor e média sobre todos os segundos tempos e ordens de gols possíveis"""
+        formato = (max_goals_half + 1, max_goals_half + 1)
+        exposicao = {chave: np.zeros(formato) for chave in ('lucro_min', 'lucro_max', 'lucro_medio', 'fracao_lucro')}
+        
+        for inicio, bloco in self.iterate_ht_ft_grid(max_goals_half, linhas_por_lote):
+            linhas = slice(inicio, inicio + len(bloco))
+            possivel = ~np.isnan(bloco)
+            exposicao['lucro_min'][linhas] = np.nanmin(bloco, axis=(2, 3, 4))
+            exposicao['lucro_max'][linhas] = np.nanmax(bloco, axis=(2, 3, 4))
+            exposicao['lucro_medio'][linhas] = np.nanmean(bloco, axis=(2, 3, 4))
+            exposicao['fracao_lucro'][linhas] = ((bloco > TOLERANCIA_EQUILIBRIO).sum(axis=(2, 3, 4))
+                                                 / possivel.sum(axis=(2, 3, 4)))
+        
+        return exposicao
+
+# =============================================
+# 📐 SENSIBILIDADES DA CARTEIRA (JACOBIANO)
+# =============================================
+
+def ranquear_ajustes_hedge(analyzer: BettingStrategyAnalyzer, max_gols: int = MAX_GOLS_GRADE) -> List[Dict]:
+    """Ranking dos mercados pelo efeito de R$ 1 a mais de stake nos cenários em prejuízo - uma chamada vetorizada"""
+    reais = mascara_cenarios_reais(max_gols)
+    lucros = (analyzer.scenario_returns(max_gols) - analyzer.get_total_investment())[reais]
+    jacobiano = analyzer.scenario_sensitivities(max_gols)
+    d_stakes = jacobiano['stakes'][:, reais]
+    d_odds = jacobiano['odds'][:, reais]
+    
+    prejuizo = lucros < -TOLERANCIA_EQUILIBRIO
+    pior = int(np.argmin(lucros))
+    n_prejuizo = max(int(prejuizo.sum()), 1)
+    
+    ranking = [{
+        'Mercado': mercado,
+        'Δ Pior Cenário por R$ 1': d_stakes[i, pior],
+        'Δ Médio nos Prejuízos por R$ 1': d_stakes[i, prejuizo].sum() / n_prejuizo,
+        'Prejuízos Melhorados': int((d_stakes[i, prejuizo] > 0).sum()),
+        '∂Lucro/∂Odd (pior cenário)': d_odds[i, pior],
+    } for i, mercado in enumerate(jacobiano['mercados'])]
+    
+    return sorted(ranking, key=lambda linha: linha['Δ Médio nos Prejuízos por R$ 1'], reverse=True)
+
+# =============================================
+# 🛡️ MÍNIMO GARANTIDO (PIOR/MELHOR CASO COM PODA)
+# =============================================
+
+def podar_cenarios_dominados(coeficientes: np.ndarray, minimizar: bool = True) -> np.ndarray:
+    """Cenários que ainda podem ser o extremo: com stakes ≥ 0, uma coluna ≤ outra em todos os mercados a domina no mínimo"""
+    unicos, indices = np.unique(coeficientes, axis=1, return_index=True)
+    c = unicos if minimizar else -unicos
+    domina = (c[:, :, None] <= c[:, None, :]).all(axis=0)  # [i, j]: coluna i ≤ coluna j em todos os mercados
+    np.fill_diagonal(domina, False)
+    return indices[~domina.any(axis=0)]
+
+def buscar_extremos_garantidos(analyzer: BettingStrategyAnalyzer, faixas_stake: Optional[Dict[str, Tuple[float, float]]] = None,
+                               max_gols: int = MAX_GOLS_GRADE, apenas_reais: bool = True) -> Dict:
+    """Pior e melhor lucro sobre a grade de placares e a caixa de stakes por mercado
+
+    O lucro é linear nas stakes, então o extremo de cada cenário está num canto da caixa escolhido pelo sinal
+    de odd·W + R − 1; cenários dominados e colunas repetidas são podados antes da busca."""
+    mercados = analyzer.nomes
+    minimos, maximos = analyzer.stakes.copy(), analyzer.stakes.copy()
+    for posicao, nome in enumerate(mercados):
+        if faixas_stake and nome in faixas_stake:
+            minimos[posicao], maximos[posicao] = faixas_stake[nome]
+    minimos, maximos = np.maximum(minimos, 0.0), np.maximum(maximos, 0.0)
+    
+    coeficientes = analyzer.scenario_sensitivities(max_gols)['stakes']
+    cenarios = np.flatnonzero(mascara_cenarios_reais(max_gols)) if apenas_reais else np.arange(coeficientes.shape[1])
+    coeficientes = coeficientes[:, cenarios]
+    positivos, negativos = np.maximum(coeficientes, 0), np.minimum(coeficientes, 0)
+    
+    candidatos_min = podar_cenarios_dominados(coeficientes, minimizar=True)
+    pior_por_cenario = minimos @ positivos[:, candidatos_min] + maximos @ negativos[:, candidatos_min]
+    pior = candidatos_min[np.argmin(pior_por_cenario)]
+    
+    candidatos_max = podar_cenarios_dominados(coeficientes, minimizar=False)
+    melhor_por_cenario = maximos @ positivos[:, candidatos_max] + minimos @ negativos[:, candidatos_max]
+    melhor = candidatos_max[np.argmax(melhor_por_cenario)]
+    
+    return {
+        'pior_lucro': float(pior_por_cenario.min()),
+        'pior_cenario': rotulo_cenario(cenarios[pior], max_gols),
+        'stakes_pior': dict(zip(mercados, np.where(coeficientes[:, pior] > 0, minimos, maximos))),
+        'melhor_lucro': float(melhor_por_cenario.max()),
+        'melhor_cenario': rotulo_cenario(cenarios[melhor], max_gols),
+        'stakes_melhor': dict(zip(mercados, np.where(coeficientes[:, melhor] > 0, maximos, minimos))),
+        'cenarios_avaliados': len(cenarios),
+        'cenarios_candidatos': len(set(candidatos_min) | set(candidatos_max)),
+    }
+
+def otimizar_cerco(analyzer: BettingStrategyAnalyzer, bankroll: float, max_gols: int = 3,
+                   mercados: Optional[Iterable[str]] = None, faixas_stake: Optional[Dict[str, Tuple[float, float]]] = None,
+                   peso_media: float = 1e-3) -> Dict:
+    """Stakes (somando o bankroll) que maximizam o pior lucro sobre os placares reais até max_gols - um linprog
+
+    max t + peso_media · lucro médio  s.a.  t ≤ lucro(placar) ∀ placar; o peso pequeno só desempata entre ótimos do maximin."""
+    from scipy.optimize import linprog
+    
+    mercados = set(analyzer.nomes if mercados is None else mercados)
+    posicoes = [i for i, nome in enumerate(analyzer.nomes) if nome in mercados]
+    nomes = [analyzer.nomes[i] for i in posicoes]
+    
+    cenarios = np.flatnonzero(mascara_cenarios_reais(max_gols))
+    coeficientes = analyzer.scenario_sensitivities(max_gols)['stakes'][posicoes][:, cenarios]
+    # Com stakes ≥ 0, só cenários não dominados podem limitar o mínimo
+    candidatos = podar_cenarios_dominados(coeficientes, minimizar=True)
+    
+    n = len(nomes)
+    limites = [(0.0, min(bankroll, STAKE_MAXIMA_MERCADO))] * n
+    for posicao, nome in enumerate(nomes):
+        if faixas_stake and nome in faixas_stake:
+            limites[posicao] = faixas_stake[nome]
+    
+    resultado = linprog(
+        c=np.append(-peso_media * coeficientes.mean(axis=1), -1.0),
+        A_ub=np.hstack([-coeficientes[:, candidatos].T, np.ones((len(candidatos), 1))]),
+        b_ub=np.zeros(len(candidatos)),
+        A_eq=np.append(np.ones(n), 0.0)[None, :],
+        b_eq=[bankroll],
+        bounds=limites + [(None, None)],
+        method='highs',
+    )
+    if not resultado.success:
+        return {'sucesso': False, 'mensagem': resultado.message}
+    
+    stakes = np.maximum(resultado.x[:n], 0.0)
+    lucros = stakes @ coeficientes
+    pior = lucros.min()
+    return {
+        'sucesso': True,
+        'mensagem': resultado.message,
+        'stakes': dict(zip(nomes, stakes.tolist())),
+        'pior_lucro': float(pior),
+        'lucro_medio': float(lucros.mean()),
+        'cenarios_limitantes': [rotulo_cenario(cenarios[i], max_gols)
+                                for i in np.flatnonzero(lucros <= pior + TOLERANCIA_EQUILIBRIO * max(1.0, bankroll))],
+        'cenarios_avaliados': len(cenarios),
+        'cenarios_candidatos': len(candidatos),
+    }
+
+def resumo_odds_equilibrio(analyzer: BettingStrategyAnalyzer, max_gols: int = MAX_GOLS_GRADE) -> Dict[str, float]:
+    """Odd a partir da qual nenhum cenário real vencido pelo mercado fica no prejuízo (1.0 = coberto a qualquer odd)"""
+    equilibrio = analyzer.break_even_odds(max_gols)[:, mascara_cenarios_reais(max_gols)]
+    return {
+        mercado: float(np.nanmax(linha)) if not np.isnan(linha).all() else np.nan
+        for mercado, linha in zip(analyzer.nomes, equilibrio)
+    }
+
+def tabela_odds_equilibrio(analyzer: BettingStrategyAnalyzer, max_gols: int = 3) -> pd.DataFrame:
+    """Tabela (mercados com stake × placares finais) de odds de equilíbrio - a maior entre as ordens de gols possíveis"""
+    reais = mascara_cenarios_reais(max_gols)
+    equilibrio = np.where(reais, analyzer.break_even_odds(max_gols), np.nan)
+    equilibrio = np.fmax.reduce(equilibrio.reshape(len(analyzer.nomes), -1, len(PRIMEIRO_GOL_INDICE)), axis=2)
+    placares = [f"{h}x{a}" for h in range(max_gols + 1) for a in range(max_gols + 1)]
+    tabela = pd.DataFrame(equilibrio, index=analyzer.nomes, columns=placares)
+    return tabela[tabela.notna().any(axis=1)]
+
+def get_value_analysis(investments: Dict, odds: Dict, estatisticas: Dict,
+                       metodo_margem: str = METODO_REMOCAO_MARGEM) -> Dict:
+    """Análise de valor persistente na sessão, atualizada incrementalmente a cada rerun"""
+    app_state = st.session_state.app_state
+    value_analyzer = app_state.get('value_analyzer')
+    if value_analyzer is None:
+        value_analyzer = ValueBetAnalyzer()
+        app_state['value_analyzer'] = value_analyzer
+    if value_analyzer.metodo_margem != metodo_margem:
+        # Outro método muda todas as probabilidades justas - análise completa
+        value_analyzer.metodo_margem = metodo_margem
+        value_analyzer.analysis_results = {}
+    return value_analyzer.atualizar_analise(investments, odds, estatisticas)
 
 # =============================================
 # 🔧 FUNÇÕES DE SINCRONIZAÇÃO CORRIGIDAS
@@ -1335,37 +2788,42 @@ def render_controls():
         
         with col1:
             st.markdown("**📈 Configuração de Odds**")
-            for i, bet_type in enumerate(BetType):
-                current_odds = st.session_state.app_state['odds_values'][bet_type.value]
+            odds_equilibrio = get_cache_resultados().obter_ou_calcular(
+                chave_carteira(), 'odds_equilibrio', lambda: resumo_odds_equilibrio(get_analyzer())
+            )
+            for i, spec in enumerate(mercados_do_grupo()):
+                current_odds = st.session_state.app_state['odds_values'][spec.nome]
                 new_odds = st.number_input(
-                    f"{bet_type.value}",
+                    f"{spec.nome}",
                     min_value=1.01,
                     value=float(current_odds),
                     step=0.01,
                     # 🔥 CORREÇÃO: KEY ÚNICA E ESTÁVEL
-                    key=f"odds_main_{bet_type.name}_{i}",
+                    key=f"odds_main_{spec.codigo}_{i}",
                     label_visibility="visible"
                 )
+                if not np.isnan(odds_equilibrio.get(spec.nome, np.nan)):
+                    st.caption(f"⚖️ Odd de equilíbrio: {formatar_odd_equilibrio(odds_equilibrio[spec.nome])}")
                 if new_odds != current_odds:
-                    st.session_state.app_state['odds_values'][bet_type.value] = float(new_odds)
+                    st.session_state.app_state['odds_values'][spec.nome] = float(new_odds)
                     st.rerun()
 
         with col2:
             st.markdown("**💰 Controle de Investimentos**")
-            for i, bet_type in enumerate(BetType):
-                current_investment = st.session_state.app_state['investment_values'][bet_type.value]
+            for i, spec in enumerate(mercados_do_grupo()):
+                current_investment = st.session_state.app_state['investment_values'][spec.nome]
                 new_investment = st.number_input(
-                    f"{bet_type.value} - R$",
+                    f"{spec.nome} - R$",
                     min_value=0.0,
-                    max_value=100.0,
+                    max_value=STAKE_MAXIMA_MERCADO,
                     value=float(current_investment),
                     step=0.10,
                     # 🔥 CORREÇÃO: KEY ÚNICA E ESTÁVEL
-                    key=f"inv_main_{bet_type.name}_{i}",
+                    key=f"inv_main_{spec.codigo}_{i}",
                     label_visibility="visible"
                 )
                 if new_investment != current_investment:
-                    st.session_state.app_state['investment_values'][bet_type.value] = float(new_investment)
+                    st.session_state.app_state['investment_values'][spec.nome] = float(new_investment)
                     st.session_state.app_state['distribution_applied'] = False
                     st.rerun()
                     
@@ -1454,9 +2912,82 @@ def render_controls():
                     except Exception as e:
                         st.error(f"❌ Erro ao aplicar distribuição: {str(e)}")
 
+            # 🔥 CERCO ÓTIMO - MAXIMIZA O PIOR LUCRO COM AS ODDS ATUAIS
+            st.markdown("---")
+            st.markdown("**🧮 Cerco Ótimo (maximin)**")
+            max_gols_cerco = st.slider("Placares até (gols por equipe)", 1, 4, 3, key="cerco_max_gols")
+            
+            if st.button("🧮 Otimizar Cerco", use_container_width=True, key="otimizar_cerco_btn"):
+                mercados_linha = st.session_state.app_state.get('mercados_linha', {})
+                try:
+                    cerco = otimizar_cerco(get_analyzer(), capital_total, max_gols_cerco,
+                                           mercados=list(BET_TYPE_POR_NOME) + list(mercados_linha))
+                except ImportError:
+                    cerco = {'sucesso': False, 'mensagem': "scipy não está instalado"}
+                
+                if cerco['sucesso']:
+                    for nome, stake in cerco['stakes'].items():
+                        if nome in mercados_linha:
+                            mercados_linha[nome]['investment'] = round(stake, 2)
+                        else:
+                            st.session_state.app_state['investment_values'][nome] = round(stake, 2)
+                    st.session_state.app_state['cerco_otimo'] = cerco
+                    update_proportions_from_investments()
+                    st.rerun()
+                else:
+                    st.error(f"❌ Otimização sem solução: {cerco['mensagem']}")
+            
+            cerco = st.session_state.app_state.get('cerco_otimo')
+            if cerco:
+                st.caption(f"Pior lucro garantido: R$ {cerco['pior_lucro']:.2f} "
+                           f"(limitado por {', '.join(cerco['cenarios_limitantes'][:4])})")
+
+        render_mercados_linha()
+        
+        with st.expander("⚖️ Odds de Equilíbrio por Placar"):
+            tabela_equilibrio = get_cache_resultados().obter_ou_calcular(
+                chave_carteira(), 'tabela_odds_equilibrio', lambda: tabela_odds_equilibrio(get_analyzer())
+            )
+            st.dataframe(tabela_equilibrio.style.format(formatar_odd_equilibrio), use_container_width=True)
+            st.caption("Odd mínima do mercado para o placar deixar de dar prejuízo, com os demais valores fixos "
+                       "('qualquer odd' = placar já coberto).")
+
     with tab2:
         render_intelligent_recommendations()
 
+def render_mercados_linha(registro: Optional[Dict[str, MercadoSpec]] = None, chave_estado: str = 'mercados_linha',
+                          titulo: str = "📚 Mercados de Linha", prefixo: str = "linha"):
+    """Mercados gerados no registro (gols, handicap asiático, ambas marcam, tempos) somados à carteira"""
+    mercados_linha = st.session_state.app_state.setdefault(chave_estado, {})
+    
+    with st.expander(f"{titulo} ({len(mercados_linha)} na carteira)"):
+        grupos = [grupo for grupo in grupos_mercados(registro) if grupo != "Principal"]
+        col1, col2, col3, col4 = st.columns([1.2, 2, 1, 1])
+        with col1:
+            grupo = st.selectbox("Família", grupos, key=f"{prefixo}_grupo_select")
+        with col2:
+            nome = st.selectbox("Mercado", [spec.nome for spec in mercados_do_grupo(grupo, registro)],
+                                key=f"{prefixo}_mercado_select")
+        with col3:
+            odds = st.number_input("Odd", min_value=1.01, value=1.90, step=0.01, key=f"{prefixo}_odds_input")
+        with col4:
+            investimento = st.number_input("Stake (R$)", min_value=0.0, max_value=STAKE_MAXIMA_MERCADO, value=1.0, step=0.10,
+                                           key=f"{prefixo}_stake_input")
+        
+        if st.button("➕ Adicionar / Atualizar", key=f"{prefixo}_adicionar_btn"):
+            mercados_linha[nome] = {'investment': float(investimento), 'odds': float(odds)}
+            st.rerun()
+        
+        if mercados_linha:
+            st.dataframe(pd.DataFrame([
+                {'Mercado': nome, 'Odd': valores['odds'], 'Stake (R$)': valores['investment']}
+                for nome, valores in mercados_linha.items()
+            ]), use_container_width=True, hide_index=True)
+            remover = st.selectbox("Remover mercado", list(mercados_linha), key=f"{prefixo}_remover_select")
+            if st.button("🗑️ Remover", key=f"{prefixo}_remover_btn"):
+                del mercados_linha[remover]
+                st.rerun()
+
 # =============================================
 # 🔧 FUNÇÕES DE RENDERIZAÇÃO PRINCIPAIS ATUALIZADAS
 # =============================================
@@ -1496,13 +3027,42 @@ def render_analise_avancada_value_bets():
         'gols_sofridos_azarao': st.session_state.app_state.get('gols_sofridos_azarao', 10)
     }
     
-    # Análise de valor
-    analyzer = ValueBetAnalyzer()
-    analysis = analyzer.analisar_valor_apostas(investments, odds, estatisticas)
-    
-    # Gerar planos otimizados
-    planner = InvestmentPlanner()
-    plans = planner.gerar_planos_otimizados(analysis, bankroll)
+    # 🔥 RATINGS AJUSTADOS OFFLINE (ajuste_parametros.py) SUBSTITUEM AS MÉDIAS DOS ÚLTIMOS 5 JOGOS
+    with st.expander("📂 Ratings Ajustados (ataque/defesa/mando)", expanded=False):
+        parametros = carregar_parametros()
+        if parametros is None:
+            st.caption("Nenhum ajuste encontrado - gere com: python ajuste_parametros.py historico.csv")
+        else:
+            st.caption(f"{len(parametros.equipes)} equipes, {parametros.metadados['jogos']} jogos - "
+                       f"ajustado em {parametros.metadados['ajustado_em']}")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                equipe_fav = st.selectbox("Favorito", parametros.equipes, key="rating_favorito")
+            with col2:
+                equipe_aza = st.selectbox("Azarão", parametros.equipes, index=min(1, len(parametros.equipes) - 1), key="rating_azarao")
+            with col3:
+                mando = st.radio("Mando", ["Favorito em casa", "Azarão em casa", "Neutro"], key="rating_mando")
+            if st.checkbox("Usar ratings ajustados na análise de valor", key="usar_ratings") and equipe_fav != equipe_aza:
+                favorito_mandante = {"Favorito em casa": True, "Azarão em casa": False, "Neutro": None}[mando]
+                lambda_fav, lambda_aza = parametros.lambdas(equipe_fav, equipe_aza, favorito_mandante)
+                estatisticas.update(lambda_favorito=lambda_fav, lambda_azarao=lambda_aza, rho_dixon_coles=parametros.rho)
+                st.caption(f"Gols esperados: {equipe_fav} {lambda_fav:.2f} × {lambda_aza:.2f} {equipe_aza} (ρ = {parametros.rho:.3f})")
+    
+    metodo_margem = st.selectbox("Remoção de margem (odds justas por livro)", METODOS_REMOCAO_MARGEM,
+                                 index=METODOS_REMOCAO_MARGEM.index(METODO_REMOCAO_MARGEM), key="metodo_margem")
+    
+    # Análise de valor e planos - cache por impressão digital; nos misses só recalcula os mercados alterados
+    def calcular_valor_e_planos():
+        analysis = copy.deepcopy(get_value_analysis(investments, odds, estatisticas, metodo_margem))
+        prob_placares = st.session_state.app_state['value_analyzer'].matriz_placares(estatisticas)
+        # Planejador persistente: o Kelly parte da solução do último tick de odds
+        planner = st.session_state.app_state.setdefault('investment_planner', InvestmentPlanner())
+        plans = copy.deepcopy(planner.gerar_planos_otimizados(analysis, bankroll, prob_placares, odds))
+        return analysis, plans, planner.fronteira_eficiente(bankroll, prob_placares)
+    
+    analysis, plans, fronteira = get_cache_resultados().obter_ou_calcular(
+        impressao_digital(odds, investments, estatisticas, bankroll, metodo_margem), 'valor_planos', calcular_valor_e_planos
+    )
     
     # 🔥 RESUMO EXECUTIVO
     st.subheader("📊 Resumo Executivo - Análise de Valor")
@@ -1520,7 +3080,8 @@ def render_analise_avancada_value_bets():
     
     with col3:
         margem_casa = analysis['resumo']['margem_casa']
-        st.metric("Margem da Casa", f"{margem_casa:.1f}%")
+        st.metric("Margem da Casa", f"{margem_casa:.1f}%" if np.isfinite(margem_casa) else "—",
+                  help="Média das margens dos livros completos (ex.: Mais/Menos 1.5, Vitória Favorito/Dupla Chance X2)")
     
     with col4:
         apostas_lucrativas = analysis['resumo']['apostas_lucrativas']
@@ -1560,7 +3121,10 @@ def render_analise_avancada_value_bets():
                 'ROI Esperado (%)': metricas['roi_esperado'],
                 'Prob. Lucro (%)': metricas['probabilidade_lucro'],
                 'Utilização Bankroll (%)': metricas['utilizacao_bankroll'],
-                'Risco (SD)': metricas['desvio_padrao']
+                'Risco (SD)': metricas['desvio_padrao'],
+                'VaR 95% (R$)': metricas.get('var_95', np.nan),
+                'CVaR 95% (R$)': metricas.get('cvar_95', np.nan),
+                'Pior Cenário (R$)': metricas['pior_cenario']
             })
     
     if plan_data:
@@ -1577,8 +3141,28 @@ def render_analise_avancada_value_bets():
             'ROI Esperado (%)': '{:.1f}%',
             'Prob. Lucro (%)': '{:.1f}%',
             'Utilização Bankroll (%)': '{:.1f}%',
-            'Risco (SD)': 'R$ {:.2f}'
+            'Risco (SD)': 'R$ {:.2f}',
+            'VaR 95% (R$)': 'R$ {:.2f}',
+            'CVaR 95% (R$)': 'R$ {:.2f}',
+            'Pior Cenário (R$)': 'R$ {:.2f}'
         }), use_container_width=True, key="tabela_comparacao_planos")
+        
+        # 🔥 FRONTEIRA EFICIENTE - TODAS AS ALOCAÇÕES ÓTIMAS DE RISCO × RETORNO
+        fig_fronteira = px.line(
+            pd.DataFrame({'Risco (SD)': fronteira['risco'], 'EV (R$)': fronteira['retorno'],
+                          'CVaR 95% (R$)': fronteira['cvar'], 'Aversão ao Risco': fronteira['aversao']}),
+            x='Risco (SD)', y='EV (R$)', hover_data=['CVaR 95% (R$)', 'Aversão ao Risco'],
+            title="Fronteira Eficiente (média–variância) e Planos Atuais"
+        )
+        fig_fronteira.add_scatter(x=df_comparacao['Risco (SD)'], y=df_comparacao['EV (R$)'], mode='markers+text',
+                                  text=df_comparacao['Plano'], textposition='top center', name='Planos')
+        st.plotly_chart(fig_fronteira, use_container_width=True, key="fronteira_eficiente")
+        
+        if 'kelly' in plans:
+            st.caption(f"KELLY: {FRACAO_KELLY:.0%} do Kelly completo - máximo crescimento esperado do bankroll "
+                       "sobre a distribuição conjunta de placares")
+            if st.button("📐 Aplicar Plano Kelly", key="aplicar_plano_kelly"):
+                aplicar_plano({mercado: round(plans['kelly']['alocacoes'].get(mercado, 0.0), 2) for mercado in BET_TYPE_POR_NOME})
     
     # 🔥 RECOMENDAÇÕES ESPECÍFICAS
     st.subheader("🎯 Recomendações de Ação Imediata")
@@ -1598,7 +3182,9 @@ def render_analise_avancada_value_bets():
             with col2:
                 st.metric("Prob. Real", f"{dados['probabilidade_real']:.1f}%")
             with col3:
-                st.metric("Prob. Implícita", f"{dados['probabilidade_implícita']:.1f}%")
+                st.metric("Prob. Implícita", f"{dados['probabilidade_implícita']:.1f}%",
+                          delta=f"justa {dados['probabilidade_justa']:.1f}%" if dados['probabilidade_justa'] is not None else None,
+                          delta_color="off")
             with col4:
                 st.metric("EV Esperado", f"R$ {dados['ev']:.2f}")
             
@@ -1617,12 +3203,31 @@ def render_analise_avancada_value_bets():
                     st.session_state.app_state['investment_values'][mercado] = novo_investimento
                     st.success(f"Posição reduzida para R$ {novo_investimento:.2f}")
                     st.rerun()
-    
+
+    # 🔥 RODADA COMPLETA - TODAS AS PARTIDAS DE UMA VEZ
+    with st.expander("📅 Probabilidades da Rodada (CSV com uma partida por linha)", expanded=False):
+        st.caption("Colunas: " + ", ".join(estatisticas) + " - opcionalmente 'partida' para identificar a linha e "
+                   f"'{PREFIXO_ODD_RODADA}<mercado>' com as odds (probabilidade justa, vantagem e margem por livro)")
+        arquivo_rodada = st.file_uploader("Estatísticas da rodada", type="csv", key="csv_rodada")
+        if arquivo_rodada is not None:
+            partidas = pd.read_csv(arquivo_rodada)
+            if 'partida' in partidas.columns:
+                partidas = partidas.set_index('partida')
+            colunas_reconhecidas = set(estatisticas) | {'lambda_favorito', 'lambda_azarao'} | {
+                PREFIXO_ODD_RODADA + mercado for mercado in REGISTRO_MERCADOS}
+            if partidas.empty:
+                st.error("❌ O arquivo não tem nenhuma partida.")
+            else:
+                if not colunas_reconhecidas & set(partidas.columns):
+                    st.warning("⚠️ Nenhuma coluna de estatísticas reconhecida - todas as partidas usam os valores padrão.")
+                st.dataframe(calcular_probabilidades_rodada(partidas, metodo_margem=metodo_margem).style.format(
+                    '{:.1f}%', na_rep='—'), use_container_width=True)
+
 
 def aplicar_plano(alocacoes: Dict):
-    """Aplica um plano de alocação automaticamente"""
+    """Aplica um plano de alocação automaticamente - stakes limitadas aos campos de investimento [0, STAKE_MAXIMA_MERCADO]"""
     for mercado, investimento in alocacoes.items():
-        st.session_state.app_state['investment_values'][mercado] = investimento
+        st.session_state.app_state['investment_values'][mercado] = min(max(investimento, 0.0), STAKE_MAXIMA_MERCADO)
     
     # Atualizar totais
     total_investido = sum(st.session_state.app_state['investment_values'].values())
@@ -1650,9 +3255,7 @@ def transmitir_analise_para_hedge(relatorio_completo: str, estatisticas: Dict, o
         
         # Calcular cenários críticos para hedge
         analyzer = get_analyzer()
-        zero_result = analyzer.calculate_scenario_profit(0, 0, None)
-        fav_result = analyzer.calculate_scenario_profit(1, 1, True)
-        aza_result = analyzer.calculate_scenario_profit(1, 1, False)
+        zero_result, fav_result, aza_result = analyzer.calculate_scenarios([(0, 0, None), (1, 1, True), (1, 1, False)])
         
         # Preparar dados para transmissão
         dados_transmissao = {
@@ -1809,7 +3412,8 @@ def criar_contexto_partida_para_hedge(informacoes: Dict, estatisticas: Dict):
             statistics=stats,
             event_type=MatchEvent.MATCH_START,
             momentum="EQUILIBRADO",
-            additional_notes=f"Análise pré-partida: {informacoes['cenario_principal']}"
+            additional_notes=f"Análise pré-partida: {informacoes['cenario_principal']}",
+            lambdas_pre_jogo=lambdas_estatisticas(estatisticas)
         )
         
         return context
@@ -1818,6 +3422,123 @@ def criar_contexto_partida_para_hedge(informacoes: Dict, estatisticas: Dict):
         st.warning(f"⚠️ Contexto simplificado criado devido a: {e}")
         return None
 
+# Cenários importantes para análise - INCLUINDO CENÁRIOS PROTEGIDOS PELA NOVA APOSTA
+IMPORTANT_SCENARIOS = [
+    ('0x0', 0, 0, None, "Empate sem gols"),
+    ('1x0 FAV', 1, 0, True, "Vitória do favorito 1x0"),
+    ('0x1 AZA', 0, 1, False, "Vitória do azarão 0x1"),
+    ('1x1 FAV 1º', 1, 1, True, "Empate 1x1 com gol do favorito primeiro"),
+    ('1x1 AZA 1º', 1, 1, False, "Empate 1x1 com gol do azarão primeiro"),
+    ('2x0 FAV', 2, 0, True, "Vitória convincente do favorito"),
+    ('0x2 AZA', 0, 2, False, "Vitória convincente do azarão"),
+    ('2x1 FAV', 2, 1, True, "Vitória do favorito com gol do azarão - PROTEGIDO"),
+    ('1x2 AZA', 1, 2, False, "Vitória do azarão com gol do favorito - PROTEGIDO"),
+    ('2x2', 2, 2, None, "Empate com muitos gols - PROTEGIDO"),
+    ('3x0 FAV', 3, 0, True, "Goleada do favorito"),
+    ('0x3 AZA', 0, 3, False, "Goleada do azarão - PROTEGIDO"),
+    ('1x3 AZA', 1, 3, False, "Goleada do azarão com gol de honra - PROTEGIDO")
+]
+
+def calcular_tabela_cenarios(analyzer: BettingStrategyAnalyzer) -> Dict:
+    """Resultados dos cenários importantes e tabelas de exibição da aba Cenários"""
+    # 🔥 TODOS OS CENÁRIOS AVALIADOS NUMA ÚNICA PASSADA VETORIZADA (inclui 1x1 sem ordem de gols)
+    resultados_cenarios = analyzer.calculate_scenarios(
+        [(home_goals, away_goals, first_goal) for _, home_goals, away_goals, first_goal, _ in IMPORTANT_SCENARIOS]
+        + [(1, 1, None)]
+    )
+    resultado_1x1_sem_ordem = resultados_cenarios.pop()
+    resultados_por_nome = {scenario[0]: result for scenario, result in zip(IMPORTANT_SCENARIOS, resultados_cenarios)}
+
+    # Dados para gráficos
+    all_scenario_data = []
+    detailed_scenarios = []
+    
+    for scenario_name, home_goals, away_goals, first_goal, description in IMPORTANT_SCENARIOS:
+        result = resultados_por_nome[scenario_name]
+        
+        # Dados para gráficos
+        scenario_data = {
+            'Cenário': scenario_name,
+            'Placar': f"{home_goals}x{away_goals}",
+            'Lucro/Prejuízo': result['Lucro/Prejuízo'],
+            'ROI': result['ROI'],
+            'Status': result['Status'],
+            'Coberto': '✅' if result['Lucro/Prejuízo'] >= -TOLERANCIA_EQUILIBRIO else '❌',  # Retorno cobre o investimento
+            'Tipo': 'PRINCIPAL' if scenario_name in ['1x0 FAV', '1x1 FAV 1º', '1x1 AZA 1º'] else 'SECUNDÁRIO'
+        }
+        all_scenario_data.append(scenario_data)
+        
+        # Dados detalhados para tabela
+        detailed_scenario = {
+            'Cenário': scenario_name,
+            'Descrição': description,
+            'Placar': f"{home_goals}x{away_goals}",
+            'Investimento Total': f"R$ {result['Investimento Total']:.2f}",
+            'Retorno Total': f"R$ {result['Retorno Total']:.2f}",
+            'Lucro/Prejuízo': f"R$ {result['Lucro/Prejuízo']:.2f}",
+            'ROI': f"{result['ROI']:.1f}%",
+            'Status': result['Status'],
+            'Coberto': '✅ SIM' if result['Lucro/Prejuízo'] >= -TOLERANCIA_EQUILIBRIO else '❌ NÃO',
+            'Cobertura': f"{result['Retorno Total'] / result['Investimento Total'] * 100:.0f}%" if result['Investimento Total'] > 0 else "—",
+            'Apostas Vencedoras': ', '.join(result['Apostas Vencedoras']) if result['Apostas Vencedoras'] else 'Nenhuma',
+            # Versões numéricas para ordenação
+            'Lucro_Num': result['Lucro/Prejuízo'],
+            'ROI_Num': result['ROI'],
+            'Investimento_Num': result['Investimento Total'],
+            'Prioridade': 1 if scenario_name in ['1x0 FAV', '1x1 FAV 1º'] else 2
+        }
+        detailed_scenarios.append(detailed_scenario)
+    
+    df_all = pd.DataFrame(all_scenario_data)
+    df_detailed = pd.DataFrame(detailed_scenarios)
+    
+    return {
+        'resultados_por_nome': resultados_por_nome,
+        'resultado_1x1_sem_ordem': resultado_1x1_sem_ordem,
+        'df_all': df_all,
+        'df_detailed': df_detailed,
+        'detailed_scenarios': detailed_scenarios
+    }
+
+def calcular_mapa_cobertura(analyzer: BettingStrategyAnalyzer, max_gols: int = MAX_GOLS_GRADE) -> Dict:
+    """Mapa de cobertura da grade de payoff: placares em lucro, mercados que pagam em cada um e quanto"""
+    reais = np.flatnonzero(mascara_cenarios_reais(max_gols))
+    h, a, _ = (eixo.ravel()[reais] for eixo in grade_cenarios(max_gols))
+    total_investment = analyzer.get_total_investment()
+    lucros = analyzer.scenario_returns(max_gols)[reais] - total_investment
+    
+    # Retorno de cada mercado em cada cenário: stake·(odd·W + R)
+    jacobiano = analyzer.scenario_sensitivities(max_gols)
+    stakes = analyzer.stakes
+    retornos = stakes[:, None] * (jacobiano['stakes'][:, reais] + 1.0)
+    
+    cobertos = lucros >= -TOLERANCIA_EQUILIBRIO
+    com_gol_azarao = a > 0
+    retorno_cobertos = retornos[:, cobertos].sum()
+    
+    cobertura_por_mercado = pd.DataFrame({
+        'Mercado': analyzer.nomes,
+        'Stake (R$)': stakes,
+        'Placares Cobertos que Paga': (retornos[:, cobertos] > 0).sum(axis=1),
+        'Retorno nos Cobertos (R$)': retornos[:, cobertos].sum(axis=1),
+        'Participação (%)': retornos[:, cobertos].sum(axis=1) / retorno_cobertos * 100 if retorno_cobertos > 0 else 0.0,
+    })
+    
+    pior = int(np.argmin(lucros))
+    return {
+        'placares': [rotulo_cenario(indice, max_gols) for indice in reais],
+        'lucros': lucros,
+        'cobertos': cobertos,
+        'n_cenarios': len(reais),
+        'n_cobertos': int(cobertos.sum()),
+        'n_gol_azarao': int(com_gol_azarao.sum()),
+        'n_gol_azarao_cobertos': int((cobertos & com_gol_azarao).sum()),
+        'mercados_ativos': int((cobertura_por_mercado['Placares Cobertos que Paga'] > 0).sum()),
+        'pior_placar': rotulo_cenario(reais[pior], max_gols),
+        'pior_lucro': float(lucros[pior]),
+        'cobertura_por_mercado': cobertura_por_mercado[stakes > 0].sort_values('Retorno nos Cobertos (R$)', ascending=False),
+    }
+
 def render_detailed_scenario_analysis():
     """Renderiza análise detalhada de cenários com destaque para 1x1 e 1x0 - SISTEMA DE CERCO COMPLETO"""
     st.subheader("📈 Análise Avançada de Cenários - SISTEMA DE CERCO COMPLETO")
@@ -1825,8 +3546,13 @@ def render_detailed_scenario_analysis():
     analyzer = get_analyzer()
     total_investment = analyzer.get_total_investment()
     
-    # 🔥 CORREÇÃO: INICIALIZAR scenario_profits ANTES DE QUALQUER USO
-    scenario_profits = {}
+    # 🔥 CENÁRIOS E TABELAS CALCULADOS UMA VEZ POR CARTEIRA (reruns de filtro/aba reaproveitam o cache)
+    tabela_cenarios = get_cache_resultados().obter_ou_calcular(
+        chave_carteira(), 'tabela_cenarios', lambda: calcular_tabela_cenarios(analyzer)
+    )
+    resultados_por_nome = tabela_cenarios['resultados_por_nome']
+    resultado_1x1_sem_ordem = tabela_cenarios['resultado_1x1_sem_ordem']
+    scenario_profits = {nome: result['Lucro/Prejuízo'] for nome, result in resultados_por_nome.items()}
     
     # 🔥 NOVO: BOTÃO PARA TRANSMITIR ANÁLISE PARA HEDGE DINÂMICO
     if 'generated_prompt' in st.session_state:
@@ -1877,25 +3603,40 @@ def render_detailed_scenario_analysis():
     # 🔥 SISTEMA DE CERCO COMPLETO - RESUMO EXECUTIVO
     st.markdown("### 🛡️ SISTEMA DE CERCO COMPLETO IMPLEMENTADO")
     
+    # 🔥 MAPA DE COBERTURA CALCULADO DA GRADE DE PAYOFF (cache por carteira)
+    mapa_cobertura = get_cache_resultados().obter_ou_calcular(
+        chave_carteira(), 'mapa_cobertura', lambda: calcular_mapa_cobertura(analyzer)
+    )
+    
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Resultados Cobertos", "5/5", "100%")
+        st.metric("Resultados Cobertos", f"{mapa_cobertura['n_cobertos']}/{mapa_cobertura['n_cenarios']}",
+                  f"{mapa_cobertura['n_cobertos'] / mapa_cobertura['n_cenarios'] * 100:.0f}%")
     
     with col2:
-        st.metric("Proteção Azarão", "✅ ATIVA", "Mais 0,5 Gols")
+        st.metric("Proteção Azarão", f"{mapa_cobertura['n_gol_azarao_cobertos']}/{mapa_cobertura['n_gol_azarao']}",
+                  "Placares com gol do azarão", delta_color="off")
     
     with col3:
-        st.metric("Hedge Natural", "✅ OTIMIZADO", "Sinergia Completa")
+        st.metric("Hedge Natural", f"{mapa_cobertura['mercados_ativos']} mercados", "Pagam em placares cobertos",
+                  delta_color="off")
     
     with col4:
-        st.metric("Cerco Estratégico", "🎯 COMPLETO", "Triângulo Principal")
+        st.metric("Pior Placar", f"R$ {mapa_cobertura['pior_lucro']:.2f}", mapa_cobertura['pior_placar'], delta_color="off")
+    
+    with st.expander("🧭 Cobertura por Mercado", expanded=False):
+        st.dataframe(mapa_cobertura['cobertura_por_mercado'].style.format({
+            'Stake (R$)': 'R$ {:.2f}',
+            'Retorno nos Cobertos (R$)': 'R$ {:.2f}',
+            'Participação (%)': '{:.1f}%'
+        }), use_container_width=True, hide_index=True)
     
     # 🔥 DESTAQUE ESPECIAL PARA O CENÁRIO 1X0 - CENÁRIO PRINCIPAL
     st.markdown("### 🎯 CENÁRIO PRINCIPAL: VITÓRIA 1x0 FAVORITO")
     
     # Análise específica do 1x0
-    resultado_1x0 = analyzer.calculate_scenario_profit(1, 0, True)
+    resultado_1x0 = resultados_por_nome['1x0 FAV']
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -1970,7 +3711,7 @@ def render_detailed_scenario_analysis():
     st.markdown("### 🎯 CENÁRIO CRÍTICO: EMPATE 1x1")
     
     # Análise específica do 1x1
-    resultado_1x1 = analyzer.calculate_scenario_profit(1, 1, None)
+    resultado_1x1 = resultado_1x1_sem_ordem
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -2048,21 +3789,6 @@ def render_detailed_scenario_analysis():
     cenarios_cerco = ['1x0 FAV', '1x1 FAV 1º', '1x1 AZA 1º', '0x0', '2x1 FAV']
     cenarios_lucrativos = 0
     
-    # 🔥 CORREÇÃO: GARANTIR QUE scenario_profits ESTÁ PREENCHIDO
-    if not scenario_profits:
-        # Se ainda não foi preenchido, calcular os cenários
-        important_scenarios = [
-            ('1x0 FAV', 1, 0, True, "Vitória do favorito 1x0"),
-            ('1x1 FAV 1º', 1, 1, True, "Empate 1x1 com gol do favorito primeiro"),
-            ('1x1 AZA 1º', 1, 1, False, "Empate 1x1 com gol do azarão primeiro"),
-            ('0x0', 0, 0, None, "Empate sem gols"),
-            ('2x1 FAV', 2, 1, True, "Vitória do favorito com gol do azarão - PROTEGIDO")
-        ]
-        
-        for scenario_name, home_goals, away_goals, first_goal, description in important_scenarios:
-            result = analyzer.calculate_scenario_profit(home_goals, away_goals, first_goal)
-            scenario_profits[scenario_name] = result['Lucro/Prejuízo']
-    
     for cenario in cenarios_cerco:
         if cenario in scenario_profits and scenario_profits[cenario] > 0:
             cenarios_lucrativos += 1
@@ -2081,74 +3807,16 @@ def render_detailed_scenario_analysis():
         risco_residual = max(0, 100 - eficiencia_cerco)
         st.metric("Risco Residual", f"{risco_residual:.1f}%")
 
-    # Cenários importantes para análise - INCLUINDO CENÁRIOS PROTEGIDOS PELA NOVA APOSTA
-    important_scenarios = [
-        ('0x0', 0, 0, None, "Empate sem gols"),
-        ('1x0 FAV', 1, 0, True, "Vitória do favorito 1x0"),
-        ('0x1 AZA', 0, 1, False, "Vitória do azarão 0x1"),
-        ('1x1 FAV 1º', 1, 1, True, "Empate 1x1 com gol do favorito primeiro"),
-        ('1x1 AZA 1º', 1, 1, False, "Empate 1x1 com gol do azarão primeiro"),
-        ('2x0 FAV', 2, 0, True, "Vitória convincente do favorito"),
-        ('0x2 AZA', 0, 2, False, "Vitória convincente do azarão"),
-        ('2x1 FAV', 2, 1, True, "Vitória do favorito com gol do azarão - PROTEGIDO"),
-        ('1x2 AZA', 1, 2, False, "Vitória do azarão com gol do favorito - PROTEGIDO"),
-        ('2x2', 2, 2, None, "Empate com muitos gols - PROTEGIDO"),
-        ('3x0 FAV', 3, 0, True, "Goleada do favorito"),
-        ('0x3 AZA', 0, 3, False, "Goleada do azarão - PROTEGIDO"),
-        ('1x3 AZA', 1, 3, False, "Goleada do azarão com gol de honra - PROTEGIDO")
-    ]
-    
-    # Dados para gráficos
-    all_scenario_data = []
-    detailed_scenarios = []
-    
-    for scenario_name, home_goals, away_goals, first_goal, description in important_scenarios:
-        result = analyzer.calculate_scenario_profit(home_goals, away_goals, first_goal)
-        
-        # 🔥 CORREÇÃO: ATUALIZAR scenario_profits
-        scenario_profits[scenario_name] = result['Lucro/Prejuízo']
-        
-        # Dados para gráficos
-        scenario_data = {
-            'Cenário': scenario_name,
-            'Placar': f"{home_goals}x{away_goals}",
-            'Lucro/Prejuízo': result['Lucro/Prejuízo'],
-            'ROI': result['ROI'],
-            'Status': result['Status'],
-            'Protegido': '✅' if away_goals > 0 else '❌',  # Indica se cenário é protegido pela nova aposta
-            'Tipo': 'PRINCIPAL' if scenario_name in ['1x0 FAV', '1x1 FAV 1º', '1x1 AZA 1º'] else 'SECUNDÁRIO'
-        }
-        all_scenario_data.append(scenario_data)
-        
-        # Dados detalhados para tabela
-        detailed_scenario = {
-            'Cenário': scenario_name,
-            'Descrição': description,
-            'Placar': f"{home_goals}x{away_goals}",
-            'Investimento Total': f"R$ {result['Investimento Total']:.2f}",
-            'Retorno Total': f"R$ {result['Retorno Total']:.2f}",
-            'Lucro/Prejuízo': f"R$ {result['Lucro/Prejuízo']:.2f}",
-            'ROI': f"{result['ROI']:.1f}%",
-            'Status': result['Status'],
-            'Proteção Azarão': '✅ SIM' if away_goals > 0 else '❌ NÃO',
-            'Apostas Vencedoras': ', '.join(result['Apostas Vencedoras']) if result['Apostas Vencedoras'] else 'Nenhuma',
-            # Versões numéricas para ordenação
-            'Lucro_Num': result['Lucro/Prejuízo'],
-            'ROI_Num': result['ROI'],
-            'Investimento_Num': result['Investimento Total'],
-            'Prioridade': 1 if scenario_name in ['1x0 FAV', '1x1 FAV 1º'] else 2
-        }
-        detailed_scenarios.append(detailed_scenario)
-    
-    df_all = pd.DataFrame(all_scenario_data)
-    df_detailed = pd.DataFrame(detailed_scenarios)
+    df_all = tabela_cenarios['df_all']
+    df_detailed = tabela_cenarios['df_detailed']
+    detailed_scenarios = tabela_cenarios['detailed_scenarios']
     
     # Métricas principais
     profitable_scenarios = len([s for s in detailed_scenarios if s['Status'] == '✅ Lucro'])
     neutral_scenarios = len([s for s in detailed_scenarios if s['Status'] == '⚖️ Equilíbrio'])
     losing_scenarios = len([s for s in detailed_scenarios if s['Status'] == '❌ Prejuízo'])
     
-    protected_scenarios = len([s for s in detailed_scenarios if s['Proteção Azarão'] == '✅ SIM'])
+    protected_scenarios = len([s for s in detailed_scenarios if s['Coberto'] == '✅ SIM'])
     
     # 🔥 GRÁFICOS EXISTENTES - MELHORADOS
     col1, col2 = st.columns(2)
@@ -2160,27 +3828,174 @@ def render_detailed_scenario_analysis():
         st.plotly_chart(fig_profit, use_container_width=True, key="grafico_lucro_cenarios")
     
     with col2:
-        fig_roi = px.bar(df_all, x='Cenário', y='ROI', color='Protegido',
-                        title='ROI por Cenário - Proteção Mais 0,5 Azarão (%)',
+        fig_roi = px.bar(df_all, x='Cenário', y='ROI', color='Coberto',
+                        title='ROI por Cenário - Cobertura da Carteira (%)',
                         color_discrete_map={'✅': '#00FF00', '❌': '#FF0000'})
         st.plotly_chart(fig_roi, use_container_width=True, key="grafico_roi_cenarios")
     
+    # 🔥 MAPA DE CALOR - EXPOSIÇÃO EM TODOS OS PLACARES
+    st.markdown("### 🗺️ MAPA DE EXPOSIÇÃO - TODOS OS PLACARES")
+    
+    max_gols_mapa = st.slider("Gols máximos por equipe:", 3, 10, 5, key="max_gols_mapa_exposicao")
+    # Placares com os dois times marcando dependem de quem marcou primeiro: mapa no pior caso, melhor placar no melhor
+    grade_lucros = get_cache_resultados().obter_ou_calcular(
+        chave_carteira(), f'grade_lucros_min_{max_gols_mapa}', lambda: analyzer.calculate_profit_grid(max_gols_mapa)
+    )
+    grade_melhor = get_cache_resultados().obter_ou_calcular(
+        chave_carteira(), f'grade_lucros_max_{max_gols_mapa}',
+        lambda: analyzer.calculate_profit_grid(max_gols_mapa, reducao='max')
+    )
+    
+    fig_mapa = px.imshow(
+        grade_lucros,
+        x=[str(g) for g in range(max_gols_mapa + 1)],
+        y=[str(g) for g in range(max_gols_mapa + 1)],
+        labels={'x': 'Gols Azarão', 'y': 'Gols Favorito', 'color': 'Lucro/Prejuízo (R$)'},
+        color_continuous_scale='RdYlGn',
+        color_continuous_midpoint=0,
+        text_auto='.2f',
+        title='Lucro/Prejuízo por Placar Final (R$) - pior ordem dos gols'
+    )
+    st.plotly_chart(fig_mapa, use_container_width=True, key="mapa_exposicao_placares")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Pior Placar", f"R$ {grade_lucros.min():.2f}")
+    with col2:
+        st.metric("Melhor Placar", f"R$ {grade_melhor.max():.2f}")
+    with col3:
+        st.metric("Placares com Lucro", f"{int((grade_lucros > 0).sum())}/{grade_lucros.size}")
+    
+    # 🔥 MÍNIMO GARANTIDO - PIOR CASO NA GRADE E NAS FAIXAS DE STAKE
+    with st.expander("🛡️ Mínimo Garantido (grade de placares × faixas de stake)", expanded=False):
+        variacao_stake = st.slider("Variação das stakes (±%):", 0, 100, 0, step=5, key="variacao_stake_garantia")
+        faixas_stake = {
+            nome: (bet.investment * (1 - variacao_stake / 100), bet.investment * (1 + variacao_stake / 100))
+            for nome, bet in analyzer.mercados.items()
+        }
+        extremos = get_cache_resultados().obter_ou_calcular(
+            impressao_digital(chave_carteira(), max_gols_mapa, variacao_stake), 'extremos_garantidos',
+            lambda: buscar_extremos_garantidos(analyzer, faixas_stake, max_gols_mapa)
+        )
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Mínimo Garantido", f"R$ {extremos['pior_lucro']:.2f}", extremos['pior_cenario'], delta_color="off")
+        with col2:
+            st.metric("Máximo Possível", f"R$ {extremos['melhor_lucro']:.2f}", extremos['melhor_cenario'], delta_color="off")
+        with col3:
+            st.metric("Cenários Após Poda", f"{extremos['cenarios_candidatos']}/{extremos['cenarios_avaliados']}")
+        
+        st.dataframe(pd.DataFrame({
+            'Stake no Pior Caso (R$)': extremos['stakes_pior'],
+            'Stake no Melhor Caso (R$)': extremos['stakes_melhor'],
+        }).style.format('R$ {:.2f}'), use_container_width=True)
+    
+    # 🔥 ESTRESSE DE ODDS - VARREDURA EM LOTES COM MEMÓRIA LIMITADA
+    with st.expander("🌊 Estresse de Odds (varredura em lotes)", expanded=False):
+        col1, col2 = st.columns(2)
+        with col1:
+            n_amostras = st.select_slider("Carteiras simuladas:", [1_000, 10_000, 100_000, 1_000_000], 10_000,
+                                          key="estresse_n_amostras")
+        with col2:
+            desvio_odds = st.slider("Oscilação das odds (±%):", 1, 30, 5, key="estresse_desvio_odds")
+        
+        estresse = get_cache_resultados().obter_ou_calcular(
+            impressao_digital(chave_carteira(), max_gols_mapa, n_amostras, desvio_odds), 'estresse_odds',
+            lambda: varrer_carteiras_em_lotes(
+                lotes_perturbacao_odds(analyzer.stakes, analyzer.odds, n_amostras, desvio_odds / 100),
+                tuple(analyzer.nomes), max_gols_mapa,
+                limites_lucro=limites_perturbacao_odds(analyzer.stakes, analyzer.odds, tuple(analyzer.nomes),
+                                                       desvio_odds / 100, max_gols_mapa)
+            )
+        )
+        
+        centros = (estresse['bordas'][:-1] + estresse['bordas'][1:]) / 2
+        fig_estresse = px.bar(x=centros, y=estresse['histograma'],
+                              labels={'x': 'Lucro/Prejuízo (R$)', 'y': 'Cenários × Carteiras'},
+                              title=f"Distribuição de Lucros em {estresse['carteiras']:,} Carteiras Simuladas")
+        st.plotly_chart(fig_estresse, use_container_width=True, key="histograma_estresse_odds")
+        
+        reais = mascara_cenarios_reais(max_gols_mapa)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Pior Lucro na Varredura", f"R$ {estresse['lucro_min'][reais].min():.2f}")
+        with col2:
+            st.metric("Melhor Lucro na Varredura", f"R$ {estresse['lucro_max'][reais].max():.2f}")
+    
+    # 🔥 ORDEM DOS GOLS - MERCADOS DEPENDENTES DA SEQUÊNCIA
+    with st.expander("🔀 Impacto da Ordem dos Gols (todas as sequências)", expanded=False):
+        grade_sequencias = get_cache_resultados().obter_ou_calcular(
+            chave_carteira(), f'grade_sequencias_{max_gols_mapa}',
+            lambda: GoalSequenceAnalyzer(analyzer).calculate_sequence_grid(max_gols_mapa)
+        )
+        placares_sequencia = [(h, a) for h in range(max_gols_mapa + 1) for a in range(max_gols_mapa + 1 - h) if h + a > 0]
+        
+        df_sequencias = pd.DataFrame([{
+            'Placar': f"{h}x{a}",
+            'Sequências': int(grade_sequencias['sequencias'][h, a]),
+            'Pior Ordem (R$)': grade_sequencias['lucro_min'][h, a],
+            'Melhor Ordem (R$)': grade_sequencias['lucro_max'][h, a],
+            'Média (R$)': grade_sequencias['lucro_medio'][h, a]
+        } for h, a in placares_sequencia])
+        
+        st.dataframe(df_sequencias.style.format({
+            'Pior Ordem (R$)': 'R$ {:.2f}',
+            'Melhor Ordem (R$)': 'R$ {:.2f}',
+            'Média (R$)': 'R$ {:.2f}'
+        }), use_container_width=True, height=300)
+    
+    # 🔥 INTERVALO × FINAL - EXPOSIÇÃO NO INTERVALO
+    st.markdown("### ⏱️ EXPOSIÇÃO NO INTERVALO - 1º TEMPO × 2º TEMPO")
+    
+    render_mercados_linha(REGISTRO_MERCADOS_TEMPOS, 'mercados_tempos', "⏱️ Mercados de Intervalo e Tempos", "tempos")
+    mercados_tempos = st.session_state.app_state.get('mercados_tempos', {})
+    exposicao = get_cache_resultados().obter_ou_calcular(
+        impressao_digital(chave_carteira(), mercados_tempos), 'exposicao_intervalo',
+        lambda: HalfTimeFullTimeAnalyzer(analyzer, mercados_tempos).halftime_exposure()
+    )
+    
+    fig_intervalo = px.imshow(
+        exposicao['lucro_min'],
+        x=[str(g) for g in range(MAX_GOLS_TEMPO + 1)],
+        y=[str(g) for g in range(MAX_GOLS_TEMPO + 1)],
+        labels={'x': 'Gols Azarão no Intervalo', 'y': 'Gols Favorito no Intervalo', 'color': 'Pior Lucro (R$)'},
+        color_continuous_scale='RdYlGn',
+        color_continuous_midpoint=0,
+        text_auto='.2f',
+        title='Pior Lucro no 2º Tempo por Placar do Intervalo (R$)'
+    )
+    st.plotly_chart(fig_intervalo, use_container_width=True, key="mapa_exposicao_intervalo")
+    
+    df_intervalo = pd.DataFrame([{
+        'Intervalo': f"{h}x{a}",
+        'Pior 2º Tempo (R$)': exposicao['lucro_min'][h, a],
+        'Melhor 2º Tempo (R$)': exposicao['lucro_max'][h, a],
+        'Média (R$)': exposicao['lucro_medio'][h, a],
+        'Finais com Lucro': f"{exposicao['fracao_lucro'][h, a] * 100:.0f}%"
+    } for h in range(3) for a in range(3)])
+    st.dataframe(df_intervalo.style.format({
+        'Pior 2º Tempo (R$)': 'R$ {:.2f}',
+        'Melhor 2º Tempo (R$)': 'R$ {:.2f}',
+        'Média (R$)': 'R$ {:.2f}'
+    }), use_container_width=True, hide_index=True)
+    
     # 🔥 RESUMO DA PROTEÇÃO - EXPANDIDO
     st.markdown("### 🛡️ RESUMO COMPLETO DA PROTEÇÃO")
     
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Cenários Protegidos", f"{protected_scenarios}/{len(detailed_scenarios)}")
+        st.metric("Cenários Cobertos", f"{protected_scenarios}/{len(detailed_scenarios)}")
     
     with col2:
         st.metric("Cenários Lucrativos", f"{profitable_scenarios}/{len(detailed_scenarios)}")
     
     with col3:
         # Calcular eficiência da proteção
-        protected_profitable = len([s for s in detailed_scenarios if s['Proteção Azarão'] == '✅ SIM' and s['Status'] == '✅ Lucro'])
+        protected_profitable = len([s for s in detailed_scenarios if s['Coberto'] == '✅ SIM' and s['Status'] == '✅ Lucro'])
         eficiencia = (protected_profitable / protected_scenarios * 100) if protected_scenarios > 0 else 0
-        st.metric("Eficiência da Proteção", f"{eficiencia:.1f}%")
+        st.metric("Cobertos com Lucro", f"{eficiencia:.1f}%")
     
     with col4:
         cobertura_principal = len([s for s in detailed_scenarios if s['Prioridade'] == 1 and s['Status'] == '✅ Lucro'])
@@ -2195,7 +4010,7 @@ def render_detailed_scenario_analysis():
         filter_status = st.selectbox("Filtrar por Status:", 
                                    ["Todos", "✅ Lucro", "❌ Prejuízo", "⚖️ Equilíbrio"])
     with col2:
-        filter_protection = st.selectbox("Filtrar por Proteção:", 
+        filter_protection = st.selectbox("Filtrar por Cobertura:", 
                                        ["Todos", "✅ SIM", "❌ NÃO"])
     with col3:
         sort_by = st.selectbox("Ordenar por:", 
@@ -2206,7 +4021,7 @@ def render_detailed_scenario_analysis():
     if filter_status != "Todos":
         filtered_df = filtered_df[filtered_df['Status'] == filter_status]
     if filter_protection != "Todos":
-        filtered_df = filtered_df[filtered_df['Proteção Azarão'] == filter_protection]
+        filtered_df = filtered_df[filtered_df['Coberto'] == filter_protection]
     
     # Ordenar usando as colunas numéricas
     sort_mapping = {
@@ -2222,7 +4037,7 @@ def render_detailed_scenario_analysis():
         filtered_df = filtered_df.sort_values(sort_column, ascending=ascending)
     
     # Exibir tabela detalhada (apenas colunas de exibição)
-    display_columns = ['Cenário', 'Descrição', 'Placar', 'Proteção Azarão', 'Investimento Total', 
+    display_columns = ['Cenário', 'Descrição', 'Placar', 'Coberto', 'Cobertura', 'Investimento Total', 
                       'Retorno Total', 'Lucro/Prejuízo', 'ROI', 'Status', 'Apostas Vencedoras']
     
     st.dataframe(
@@ -2282,9 +4097,7 @@ def render_dinamico_integration():
             st.info("🎯 **Usando análise do Sistema Conquistador para recomendações**")
         else:
             # Calcular cenários críticos para o hedge (fallback)
-            zero_result = analyzer.calculate_scenario_profit(0, 0, None)
-            fav_result = analyzer.calculate_scenario_profit(1, 1, True)
-            aza_result = analyzer.calculate_scenario_profit(1, 1, False)
+            zero_result, fav_result, aza_result = analyzer.calculate_scenarios([(0, 0, None), (1, 1, True), (1, 1, False)])
             
             zero_profit = zero_result['Lucro/Prejuízo']
             fav_profit = fav_result['Lucro/Prejuízo']
@@ -2315,6 +4128,18 @@ def render_dinamico_integration():
                 }
                 hedge_odds[required_odd] = default_values.get(required_odd, 2.0)
         
+        # 🔥 SENSIBILIDADES - AJUSTES QUE MAIS MELHORAM OS CENÁRIOS EM PREJUÍZO
+        with st.expander("📐 Sensibilidades da Carteira (ajustes que importam)", expanded=False):
+            ranking = get_cache_resultados().obter_ou_calcular(
+                chave_carteira(), 'ranking_sensibilidades', lambda: ranquear_ajustes_hedge(analyzer)
+            )
+            st.dataframe(pd.DataFrame(ranking).style.format({
+                'Δ Pior Cenário por R$ 1': 'R$ {:+.2f}',
+                'Δ Médio nos Prejuízos por R$ 1': 'R$ {:+.2f}',
+                '∂Lucro/∂Odd (pior cenário)': 'R$ {:.2f}'
+            }), use_container_width=True, hide_index=True)
+            st.caption("Derivadas exatas da matriz de payoff: ∂Lucro/∂Stake = Odd·Vitória + Reembolso − 1 e ∂Lucro/∂Odd = Stake·Vitória.")
+        
         # Renderizar controles do hedge
         render_hedge_controls(zero_profit, fav_profit, aza_profit, hedge_odds)
         
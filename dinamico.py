@@ -7,7 +7,10 @@ from dataclasses import dataclass
 from typing import Dict, List, Tuple, Optional
 import numpy as np
 from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
 import json
+import sys
 
 # =============================
 # ENUMS E DATACLASSES SINCRONIZADOS
@@ -105,6 +108,7 @@ class MatchContext:
     momentum: str
     additional_notes: str
     timestamp: datetime = None
+    lambdas_pre_jogo: Optional[Tuple[float, float]] = None  # Gols esperados pré-jogo (favorito, azarão) da partida
     
     def __post_init__(self):
         if self.timestamp is None:
@@ -131,6 +135,276 @@ class OperationMemory:
         if self.generated_prompts is None:
             self.generated_prompts = []
 
+# =============================
+# MODELO AO VIVO - POISSON NÃO HOMOGÊNEO PRÉ-CALCULADO
+# =============================
+
+CAMINHO_TABELA_AO_VIVO = Path(__file__).with_name('tabela_ao_vivo.npy')
+MINUTOS_PARTIDA = 95            # 90 + acréscimos médios
+MAX_GOLS_RESTANTES = 6          # último índice acumula "6 ou mais"
+MAX_CARTOES_VERMELHOS = 2
+SALDO_MAXIMO = 3                # as taxas saturam a partir de ±3 gols de saldo
+LAMBDA_PADRAO_FAVORITO = 1.6
+LAMBDA_PADRAO_AZARAO = 1.0
+
+# Intensidade relativa de gols ao longo do jogo (cresce do início para o fim)
+INTENSIDADE_INICIO, INTENSIDADE_FIM = 0.8, 1.2
+# Multiplicador da taxa de uma equipe pelo próprio saldo (-3..+3): quem perde pressiona, quem ganha recua
+MULTIPLICADOR_SALDO = np.array([1.25, 1.2, 1.1, 1.0, 0.9, 0.85, 0.8])
+# Por jogador a menos (saldo de expulsões): própria taxa cai, a do adversário sobe
+EFEITO_VERMELHO_PROPRIO, EFEITO_VERMELHO_ADVERSARIO = 0.7, 1.25
+
+def ler_placar(placar: str) -> Tuple[int, int]:
+    """'2x1' → (gols favorito, gols azarão); placares ilegíveis contam como 0x0"""
+    try:
+        gols_fav, gols_aza = (int(parte) for parte in str(placar).lower().split('x'))
+        return max(gols_fav, 0), max(gols_aza, 0)
+    except ValueError:
+        return 0, 0
+
+def intensidade_por_minuto() -> np.ndarray:
+    """Fração dos gols esperados da partida em cada minuto (soma 1)"""
+    minutos = np.arange(MINUTOS_PARTIDA) + 0.5
+    intensidade = INTENSIDADE_INICIO + (INTENSIDADE_FIM - INTENSIDADE_INICIO) * minutos / MINUTOS_PARTIDA
+    return intensidade / intensidade.sum()
+
+# Fração acumulada dos gols esperados até o início de cada minuto (0..MINUTOS_PARTIDA)
+FRACAO_INTENSIDADE = np.concatenate(([0.0], np.cumsum(intensidade_por_minuto())))
+
+def taxas_por_minuto(lambda_fav: float, lambda_aza: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Taxas de gol por minuto (minuto × saldo favorito × vermelhos favorito × vermelhos azarão)"""
+    intensidade = intensidade_por_minuto()
+
+    vermelhos = np.arange(MAX_CARTOES_VERMELHOS + 1)
+    saldo_vermelhos = vermelhos[:, None] - vermelhos[None, :]   # favorito - azarão
+    efeito_fav = EFEITO_VERMELHO_PROPRIO ** np.maximum(saldo_vermelhos, 0) * EFEITO_VERMELHO_ADVERSARIO ** np.maximum(-saldo_vermelhos, 0)
+    efeito_aza = EFEITO_VERMELHO_PROPRIO ** np.maximum(-saldo_vermelhos, 0) * EFEITO_VERMELHO_ADVERSARIO ** np.maximum(saldo_vermelhos, 0)
+
+    taxa_fav = lambda_fav * intensidade[:, None, None, None] * MULTIPLICADOR_SALDO[None, :, None, None] * efeito_fav
+    taxa_aza = lambda_aza * intensidade[:, None, None, None] * MULTIPLICADOR_SALDO[::-1][None, :, None, None] * efeito_aza
+    return taxa_fav, taxa_aza
+
+def _deslocar_gol(distribuicao: np.ndarray, eixo: int) -> np.ndarray:
+    """Soma um gol no eixo indicado; a massa no último índice ("N ou mais") permanece nele"""
+    deslocada = np.zeros_like(distribuicao)
+    origem = [slice(None)] * distribuicao.ndim
+    destino = [slice(None)] * distribuicao.ndim
+    origem[eixo], destino[eixo] = slice(None, -1), slice(1, None)
+    deslocada[tuple(destino)] = distribuicao[tuple(origem)]
+    origem[eixo] = destino[eixo] = -1
+    deslocada[tuple(destino)] += distribuicao[tuple(origem)]
+    return deslocada
+
+class TabelaAoVivo:
+    """Distribuição dos gols restantes (favorito × azarão) por minuto, saldo e expulsões - consulta O(1) a cada lance"""
+
+    def __init__(self, distribuicoes: np.ndarray, lambda_favorito: float, lambda_azarao: float):
+        self.distribuicoes = distribuicoes
+        self.lambda_favorito = lambda_favorito
+        self.lambda_azarao = lambda_azarao
+        # Marginais mais consultadas já prontas
+        self.prob_gol_favorito = 1 - distribuicoes[..., 0, :].sum(axis=-1)
+        self.prob_gol_azarao = 1 - distribuicoes[..., :, 0].sum(axis=-1)
+        self.prob_sem_gols = np.array(distribuicoes[..., 0, 0])
+
+    @classmethod
+    def construir(cls, lambda_fav: float = LAMBDA_PADRAO_FAVORITO, lambda_aza: float = LAMBDA_PADRAO_AZARAO) -> 'TabelaAoVivo':
+        """Indução regressiva minuto a minuto: o saldo muda a cada gol e, com ele, as taxas das duas equipes"""
+        taxa_fav, taxa_aza = taxas_por_minuto(lambda_fav, lambda_aza)
+        taxa_total = taxa_fav + taxa_aza
+        prob_algum_gol = 1 - np.exp(-taxa_total)
+        prob_fav = (prob_algum_gol * taxa_fav / taxa_total)[..., None, None]
+        prob_aza = (prob_algum_gol * taxa_aza / taxa_total)[..., None, None]
+
+        n_saldos = 2 * SALDO_MAXIMO + 1
+        n_vermelhos = MAX_CARTOES_VERMELHOS + 1
+        distribuicoes = np.zeros((MINUTOS_PARTIDA + 1, n_saldos, n_vermelhos, n_vermelhos,
+                                  MAX_GOLS_RESTANTES + 1, MAX_GOLS_RESTANTES + 1))
+        distribuicoes[MINUTOS_PARTIDA, ..., 0, 0] = 1.0
+
+        indices_saldo = np.arange(n_saldos)
+        apos_gol_fav = np.minimum(indices_saldo + 1, n_saldos - 1)
+        apos_gol_aza = np.maximum(indices_saldo - 1, 0)
+        for minuto in range(MINUTOS_PARTIDA - 1, -1, -1):
+            seguinte = distribuicoes[minuto + 1]
+            distribuicoes[minuto] = ((1 - prob_fav[minuto] - prob_aza[minuto]) * seguinte
+                                     + prob_fav[minuto] * _deslocar_gol(seguinte[apos_gol_fav], -2)
+                                     + prob_aza[minuto] * _deslocar_gol(seguinte[apos_gol_aza], -1))
+        return cls(distribuicoes.astype(np.float32), lambda_fav, lambda_aza)
+
+    def salvar(self, caminho: Path = CAMINHO_TABELA_AO_VIVO):
+        """Grava a tabela (.npy, pronta para memory-map) e os lambdas usados (.json)"""
+        np.save(caminho, self.distribuicoes)
+        with open(Path(caminho).with_suffix('.json'), 'w', encoding='utf-8') as arquivo:
+            json.dump({'lambda_favorito': self.lambda_favorito, 'lambda_azarao': self.lambda_azarao}, arquivo)
+
+    @classmethod
+    def carregar(cls, caminho: Path = CAMINHO_TABELA_AO_VIVO) -> 'TabelaAoVivo':
+        with open(Path(caminho).with_suffix('.json'), encoding='utf-8') as arquivo:
+            lambdas = json.load(arquivo)
+        return cls(np.load(caminho, mmap_mode='r'), lambdas['lambda_favorito'], lambdas['lambda_azarao'])
+
+    @staticmethod
+    def indices(minuto: int, placar: str, vermelhos_fav: int = 0, vermelhos_aza: int = 0) -> Tuple[int, int, int, int]:
+        gols_fav, gols_aza = ler_placar(placar)
+        return (min(max(int(minuto), 0), MINUTOS_PARTIDA),
+                min(max(gols_fav - gols_aza, -SALDO_MAXIMO), SALDO_MAXIMO) + SALDO_MAXIMO,
+                min(max(int(vermelhos_fav), 0), MAX_CARTOES_VERMELHOS),
+                min(max(int(vermelhos_aza), 0), MAX_CARTOES_VERMELHOS))
+
+    def distribuicao_restante(self, minuto: int, placar: str, vermelhos_fav: int = 0, vermelhos_aza: int = 0) -> np.ndarray:
+        """P(mais i gols do favorito, mais j do azarão) até o fim"""
+        return self.distribuicoes[self.indices(minuto, placar, vermelhos_fav, vermelhos_aza)]
+
+    def probabilidade_gol_azarao(self, minuto: int, placar: str, vermelhos_fav: int = 0, vermelhos_aza: int = 0) -> float:
+        return float(self.prob_gol_azarao[self.indices(minuto, placar, vermelhos_fav, vermelhos_aza)])
+
+    def probabilidade_gol_favorito(self, minuto: int, placar: str, vermelhos_fav: int = 0, vermelhos_aza: int = 0) -> float:
+        return float(self.prob_gol_favorito[self.indices(minuto, placar, vermelhos_fav, vermelhos_aza)])
+
+    def probabilidade_sem_gols(self, minuto: int, placar: str, vermelhos_fav: int = 0, vermelhos_aza: int = 0) -> float:
+        return float(self.prob_sem_gols[self.indices(minuto, placar, vermelhos_fav, vermelhos_aza)])
+
+# Grade dos lambdas das tabelas em cache - lambdas vizinhos compartilham a mesma tabela
+PASSO_LAMBDA_TABELA = 0.05
+
+def arredondar_lambda(lambda_gols: float) -> float:
+    """Lambda no ponto mais próximo da grade das tabelas"""
+    return round(max(round(lambda_gols / PASSO_LAMBDA_TABELA), 1) * PASSO_LAMBDA_TABELA, 2)
+
+# Tabela gravada por `--gerar-tabela-ao-vivo`, mapeada uma única vez na importação (None sem arquivo)
+TABELA_AO_VIVO_ARQUIVO = (TabelaAoVivo.carregar()
+                          if CAMINHO_TABELA_AO_VIVO.exists() and CAMINHO_TABELA_AO_VIVO.with_suffix('.json').exists()
+                          else None)
+
+@lru_cache(maxsize=16)
+def _construir_tabela(lambda_fav: float, lambda_aza: float) -> TabelaAoVivo:
+    """Tabela de um par de lambdas já arredondados - o par do arquivo reaproveita a tabela memory-mapped"""
+    arquivo = TABELA_AO_VIVO_ARQUIVO
+    if arquivo is not None and (arquivo.lambda_favorito, arquivo.lambda_azarao) == (lambda_fav, lambda_aza):
+        return arquivo
+    return TabelaAoVivo.construir(lambda_fav, lambda_aza)
+
+def obter_tabela_ao_vivo(lambda_fav: float = LAMBDA_PADRAO_FAVORITO, lambda_aza: float = LAMBDA_PADRAO_AZARAO) -> TabelaAoVivo:
+    """Tabela para o par de lambdas arredondado à grade - pares no mesmo ponto reaproveitam o cache"""
+    return _construir_tabela(arredondar_lambda(lambda_fav), arredondar_lambda(lambda_aza))
+
+# Pré-calculada na importação: cada lance ao vivo é só uma consulta
+TABELA_AO_VIVO = obter_tabela_ao_vivo()
+
+# =============================
+# ATUALIZAÇÃO BAYESIANA DAS TAXAS AO VIVO (GAMMA–POISSON)
+# =============================
+
+# Peso de cada estatística em gols esperados (proxy de xG - um jogo típico soma ~1,4 por equipe)
+PESOS_XG_ESTATISTICAS = {
+    'shots_on_target': 0.22,
+    'shots_off_target': 0.03,
+    'dangerous_attacks': 0.004,
+    'corners': 0.02,
+}
+# Priori Gamma(α, β) de média 1 no multiplicador da taxa pré-jogo - equivale a N gols esperados de evidência
+FORCA_PRIORI_TAXA = 3.0
+LINHA_GOLS_TOTAIS = 2.5
+
+def _estatistica(statistics, nome: str) -> float:
+    """Lê um campo de MatchStatistics ou do dict equivalente"""
+    if isinstance(statistics, dict):
+        return statistics.get(nome, 0) or 0
+    return getattr(statistics, nome, 0) or 0
+
+def xg_estatisticas(statistics) -> np.ndarray:
+    """Gols esperados acumulados (favorito, azarão) a partir das estatísticas do jogo"""
+    xg = np.zeros(2)
+    for i, lado in enumerate(('fav', 'aza')):
+        finalizacoes = _estatistica(statistics, f'shots_{lado}')
+        no_alvo = _estatistica(statistics, f'shots_on_target_{lado}')
+        xg[i] = (PESOS_XG_ESTATISTICAS['shots_on_target'] * no_alvo
+                 + PESOS_XG_ESTATISTICAS['shots_off_target'] * max(finalizacoes - no_alvo, 0)
+                 + PESOS_XG_ESTATISTICAS['dangerous_attacks'] * _estatistica(statistics, f'dangerous_attacks_{lado}')
+                 + PESOS_XG_ESTATISTICAS['corners'] * _estatistica(statistics, f'corners_{lado}'))
+    return xg
+
+class AtualizadorTaxasAoVivo:
+    """Posteriori Gamma do multiplicador de taxa de cada equipe - cada lance soma os deltas, O(1) e 4 números de estado
+
+    xG observado ~ Poisson(θ · λ · fração do jogo decorrida) ⇒ α += ΔxG, β += λ · Δfração."""
+
+    def __init__(self, lambda_fav: float = LAMBDA_PADRAO_FAVORITO, lambda_aza: float = LAMBDA_PADRAO_AZARAO,
+                 forca_priori: float = FORCA_PRIORI_TAXA):
+        self.lambdas_pre_jogo = np.array([lambda_fav, lambda_aza], dtype=float)
+        self.forca_priori = forca_priori
+        self.reiniciar()
+
+    def definir_lambdas_pre_jogo(self, lambda_fav: float, lambda_aza: float):
+        """Semeia as taxas pré-jogo da partida - taxas diferentes indicam nova partida e reiniciam a posteriori"""
+        lambdas = np.array([lambda_fav, lambda_aza], dtype=float)
+        if not np.array_equal(lambdas, self.lambdas_pre_jogo):
+            self.lambdas_pre_jogo = lambdas
+            self.reiniciar()
+
+    @property
+    def chance_gol_pre_jogo(self) -> float:
+        """Chance de sair gol no jogo todo com as taxas pré-jogo - calculada uma vez por partida"""
+        chave = tuple(self.lambdas_pre_jogo)
+        if getattr(self, '_chave_gol_pre_jogo', None) != chave:
+            self._chance_gol_pre_jogo = 1 - obter_tabela_ao_vivo(*chave).probabilidade_sem_gols(0, "0x0")
+            self._chave_gol_pre_jogo = chave
+        return self._chance_gol_pre_jogo
+
+    def reiniciar(self):
+        self.alpha = np.full(2, self.forca_priori)
+        self.beta = np.full(2, self.forca_priori)
+        self.minuto = 0
+        self.xg = np.zeros(2)
+
+    def atualizar(self, statistics, minuto: int) -> np.ndarray:
+        """Incorpora os deltas desde o último lance; minuto ou estatísticas menores indicam nova partida"""
+        minuto = min(max(int(minuto), 0), MINUTOS_PARTIDA)
+        xg = xg_estatisticas(statistics)
+        if minuto < self.minuto or np.any(xg < self.xg):
+            self.reiniciar()
+        self.alpha += xg - self.xg
+        self.beta += self.lambdas_pre_jogo * (FRACAO_INTENSIDADE[minuto] - FRACAO_INTENSIDADE[self.minuto])
+        self.xg, self.minuto = xg, minuto
+        return self.multiplicadores
+
+    @property
+    def multiplicadores(self) -> np.ndarray:
+        """Média posteriori do ritmo de cada equipe em relação ao pré-jogo (favorito, azarão)"""
+        return self.alpha / self.beta
+
+    def tabela(self) -> TabelaAoVivo:
+        """Tabela no ponto da grade mais próximo das taxas posteriores - o lance é um acerto de cache e uma indexação"""
+        lambda_fav, lambda_aza = self.lambdas_pre_jogo * self.multiplicadores
+        return obter_tabela_ao_vivo(float(lambda_fav), float(lambda_aza))
+
+    def probabilidades(self, minuto: int, placar: str, vermelhos_fav: int = 0, vermelhos_aza: int = 0) -> Dict[str, float]:
+        """Probabilidades até o fim com as taxas posteriores (consulta à tabela ao vivo)"""
+        restante = self.tabela().distribuicao_restante(minuto, placar, vermelhos_fav, vermelhos_aza)
+        gols_fav, gols_aza = ler_placar(placar)
+        mais_fav, mais_aza = np.indices(restante.shape)
+        total_final = gols_fav + gols_aza + mais_fav + mais_aza
+        ambas = ((gols_fav + mais_fav) > 0) & ((gols_aza + mais_aza) > 0)
+        return {
+            'gol_favorito': float(1 - restante[0, :].sum()),
+            'gol_azarao': float(1 - restante[:, 0].sum()),
+            'sem_gols': float(restante[0, 0]),
+            'mais_25': float(restante[total_final > LINHA_GOLS_TOTAIS].sum()),
+            'menos_25': float(restante[total_final < LINHA_GOLS_TOTAIS].sum()),
+            'ambas_marcam': float(restante[ambas].sum()),
+            'multiplicador_favorito': float(self.multiplicadores[0]),
+            'multiplicador_azarao': float(self.multiplicadores[1]),
+        }
+
+def probabilidades_ao_vivo(statistics, minute: int, current_score: str,
+                           atualizador: Optional[AtualizadorTaxasAoVivo] = None) -> Dict[str, float]:
+    """Atualiza (ou cria, a partir dos totais acumulados) a posteriori e consulta as probabilidades do lance"""
+    atualizador = AtualizadorTaxasAoVivo() if atualizador is None else atualizador
+    atualizador.atualizar(statistics, minute)
+    return atualizador.probabilidades(minute, current_score, int(_estatistica(statistics, 'red_cards_fav')),
+                                      int(_estatistica(statistics, 'red_cards_aza')))
+
 # =============================
 # SISTEMA DE ANÁLISE DE MINUTOS E ODDS
 # =============================
@@ -433,7 +707,7 @@ Baseado no gol do { 'FAVORITO' if goal_type == 'FAV' else 'AZARÃO'} aos {minute
 class DynamicProtectionSystem:
     """Sistema de proteções dinâmicas baseadas em eventos"""
     
-    def __init__(self):
+    def __init__(self, lambda_fav: float = LAMBDA_PADRAO_FAVORITO, lambda_aza: float = LAMBDA_PADRAO_AZARAO):
         self.protection_strategies = {
             "MAIS_25_GOLS": {
                 "name": "Mais 2,5 Gols Partida",
@@ -457,47 +731,46 @@ class DynamicProtectionSystem:
                 "risk": "Baixo"
             }
         }
+        self.atualizador_taxas = AtualizadorTaxasAoVivo(lambda_fav, lambda_aza)
+
+    def probabilidades_partida(self, match_context: MatchContext) -> Dict[str, float]:
+        """Probabilidades ao vivo do lance, semeando a posteriori com as taxas pré-jogo da partida quando informadas"""
+        if match_context.lambdas_pre_jogo is not None:
+            self.atualizador_taxas.definir_lambdas_pre_jogo(*match_context.lambdas_pre_jogo)
+        return probabilidades_ao_vivo(match_context.statistics, match_context.minute,
+                                      match_context.current_score, self.atualizador_taxas)
     
     def recommend_protection_strategy(self, match_context: MatchContext, current_profits: Dict, odds_values: Dict) -> Dict:
-        """Recomenda estratégia de proteção baseada no contexto"""
+        """Recomenda estratégia de proteção a partir das probabilidades ao vivo (taxas posteriores × tabela)"""
         
         strategies = []
         
-        # Analisar contexto para recomendações
-        stats = match_context.statistics
-        
-        # Estratégia 1: Mais 2,5 Gols
-        if (stats.shots_fav + stats.shots_aza) > 10 and match_context.minute <= 60:
-            strategies.append({
-                "strategy": "MAIS_25_GOLS",
-                "name": self.protection_strategies["MAIS_25_GOLS"]["name"],
-                "reason": "Jogo movimentado com muitas finalizações",
-                "confidence": 0.7,
-                "recommended_markets": ["Mais 2,5 Gols", "Ambas Marcam - Sim"],
-                "expected_impact": "Alto potencial, risco elevado"
-            })
-        
-        # Estratégia 2: Proteção Hedge Azarão (SEMPRE RECOMENDADA)
-        if stats.shots_aza >= 2 or stats.dangerous_attacks_aza >= 3:
-            strategies.append({
-                "strategy": "PROTECAO_HEDGE_AZARAO", 
-                "name": self.protection_strategies["PROTECAO_HEDGE_AZARAO"]["name"],
-                "reason": "Azarão criando oportunidades consistentes",
-                "confidence": 0.9,
-                "recommended_markets": ["Mais 0,5 Gols Azarão", "Dupla Chance X2"],
-                "expected_impact": "Proteção sólida com bom potencial"
-            })
-        
-        # Estratégia 3: Menos 2,5 Gols
-        if (stats.shots_fav + stats.shots_aza) < 6 and match_context.minute >= 60:
-            strategies.append({
-                "strategy": "MENOS_25_GOLS",
-                "name": self.protection_strategies["MENOS_25_GOLS"]["name"], 
-                "reason": "Jogo fechado com poucas chances",
-                "confidence": 0.8,
-                "recommended_markets": ["Menos 2,5 Gols", "Ambas Marcam - Não"],
-                "expected_impact": "Proteção conservadora"
-            })
+        probabilidades = self.probabilidades_partida(match_context)
+        ritmo = (f"ritmo ×{probabilidades['multiplicador_favorito']:.2f} favorito / "
+                 f"×{probabilidades['multiplicador_azarao']:.2f} azarão vs pré-jogo")
+        
+        # Cada estratégia entra quando seu mercado principal é mais provável que a odd implica (ou > 50% sem odd)
+        candidatas = [
+            ("MAIS_25_GOLS", 'mais_25', "Mais 2,5 Gols", ["Mais 2,5 Gols", "Ambas Marcam - Sim"],
+             "Alto potencial, risco elevado"),
+            ("PROTECAO_HEDGE_AZARAO", 'gol_azarao', "Mais 0,5 Gols Azarão", ["Mais 0,5 Gols Azarão", "Dupla Chance X2"],
+             "Proteção sólida com bom potencial"),
+            ("MENOS_25_GOLS", 'menos_25', "Menos 2,5 Gols", ["Menos 2,5 Gols", "Ambas Marcam - Não"],
+             "Proteção conservadora"),
+        ]
+        for estrategia, chave, mercado, mercados_recomendados, impacto in candidatas:
+            probabilidade = probabilidades[chave]
+            odd = (odds_values or {}).get(mercado, 0)
+            limiar = 1 / odd if odd > 1 else 0.5
+            if probabilidade > limiar:
+                strategies.append({
+                    "strategy": estrategia,
+                    "name": self.protection_strategies[estrategia]["name"],
+                    "reason": f"{mercado}: {probabilidade:.0%} ao vivo vs {limiar:.0%} exigido ({ritmo})",
+                    "confidence": probabilidade,
+                    "recommended_markets": mercados_recomendados,
+                    "expected_impact": impacto
+                })
         
         # Ordenar por confiança
         strategies.sort(key=lambda x: x["confidence"], reverse=True)
@@ -505,6 +778,7 @@ class DynamicProtectionSystem:
         return {
             "recommended_strategies": strategies,
             "top_recommendation": strategies[0] if strategies else None,
+            "live_probabilities": probabilidades,
             "analysis_timestamp": datetime.now()
         }
     
@@ -920,14 +1194,14 @@ class OperationMemoryManager:
 # =============================
 
 class IAAnalyzer:
-    def __init__(self):
+    def __init__(self, protection_system: Optional[DynamicProtectionSystem] = None):
         self.risk_profiles = {
             RiskProfile.CONSERVATIVE: {"max_risk": 0.2, "protection_focus": 0.7},
             RiskProfile.MODERATE: {"max_risk": 0.3, "protection_focus": 0.5},
             RiskProfile.AGGRESSIVE: {"max_risk": 0.4, "protection_focus": 0.3}
         }
         self.minute_analyzer = MinuteOddsAnalyzer()
-        self.protection_system = DynamicProtectionSystem()
+        self.protection_system = DynamicProtectionSystem() if protection_system is None else protection_system
         self.prompt_generator = IAPromptGenerator()
     
     def analyze_current_situation(self, zero_profit: float, fav_profit: float, aza_profit: float, 
@@ -995,51 +1269,23 @@ class IAAnalyzer:
             }
         
         insights = []
-        volatility_multiplier = 1.0
-        confidence_multiplier = 1.0
-        
-        # Análise temporal
-        if match_context.minute <= 45:
-            insights.append(f"⏰ Primeiro tempo em andamento ({match_context.minute}')")
-            if match_context.minute < 25:
-                volatility_multiplier *= 0.8
-            else:
-                volatility_multiplier *= 1.2
-        else:
-            insights.append(f"⏰ Segundo tempo em andamento ({match_context.minute}')")
-            volatility_multiplier *= 1.5
-        
-        # Análise de placar
-        if match_context.current_score == "0x0":
-            insights.append("📊 Placar 0x0 - Alta incerteza")
-            volatility_multiplier *= 1.3
-        else:
-            insights.append(f"📊 Placar {match_context.current_score} - Cenário definido")
-            confidence_multiplier *= 1.2
-        
-        # Análise de momentum
-        if match_context.momentum == 'FAV':
-            insights.append("📈 Momentum do favorito")
-            confidence_multiplier *= 1.1
-        elif match_context.momentum == 'AZA':
-            insights.append("📉 Momentum do azarão")
-            volatility_multiplier *= 1.4
-        
-        # Análise de eventos específicos para Mais 0,5 Gols Azarão
-        if match_context.event_type in [MatchEvent.AZA_DANGEROUS_ATTACK, MatchEvent.AZA_CORNER, MatchEvent.AZA_SHOT_ON_TARGET]:
-            insights.append("🎯 Azarão criando oportunidades - Forte candidato para Mais 0,5 Gols")
-            volatility_multiplier *= 1.2
-            confidence_multiplier *= 1.1
-        
-        # Análise estatística para Mais 0,5 Gols Azarão
-        if match_context.statistics:
-            stats = match_context.statistics
-            if stats.shots_aza > 3 or stats.shots_on_target_aza > 1:
-                insights.append("🎯 Azarão com finalizações - Bom cenário para Mais 0,5 Gols")
-                volatility_multiplier *= 1.1
-            if stats.dangerous_attacks_aza > 5:
-                insights.append("⚡ Azarão com ataques perigosos - Probabilidade aumentada para gol")
-                volatility_multiplier *= 1.15
+        probabilidades = self.protection_system.probabilidades_partida(match_context)
+        
+        # Volatilidade restante ∝ chance de ainda sair gol (relativa ao pré-jogo); confiança cresce com o placar travado
+        chance_gol_restante = 1 - probabilidades['sem_gols']
+        chance_gol_pre_jogo = self.protection_system.atualizador_taxas.chance_gol_pre_jogo
+        volatility_multiplier = chance_gol_restante / max(chance_gol_pre_jogo, 1e-9)
+        confidence_multiplier = 1 + 0.5 * probabilidades['sem_gols']
+        
+        fase = "Primeiro" if match_context.minute <= 45 else "Segundo"
+        insights.append(f"⏰ {fase} tempo em andamento ({match_context.minute}') - "
+                        f"{1 - probabilidades['sem_gols']:.0%} de chance de mais gols")
+        insights.append(f"📊 Placar {match_context.current_score} - {probabilidades['sem_gols']:.0%} de terminar assim")
+        insights.append(f"🎯 Mais 0,5 Gols Azarão: {probabilidades['gol_azarao']:.0%} até o fim "
+                        f"(ritmo ×{probabilidades['multiplicador_azarao']:.2f} vs pré-jogo)")
+        if match_context.momentum in ('FAV', 'AZA'):
+            insights.append(f"📈 Momentum {'do favorito' if match_context.momentum == 'FAV' else 'do azarão'} - "
+                            f"ritmo favorito ×{probabilidades['multiplicador_favorito']:.2f}")
         
         return {
             'volatility_multiplier': volatility_multiplier,
@@ -1095,7 +1341,7 @@ class IAAnalyzer:
 - Finalizações do Azarão: {stats.shots_aza} (No alvo: {stats.shots_on_target_aza})
 - Ataques Perigosos Azarão: {stats.dangerous_attacks_aza}
 - Escanteios Azarão: {stats.corners_aza}
-- **PROBABILIDADE ESTIMADA:** {self._calculate_azarao_goal_probability(stats, match_context.minute):.1f}%
+- **PROBABILIDADE ESTIMADA:** {self._calculate_azarao_goal_probability(match_context):.1f}%
 
 ### 💰 SITUAÇÃO FINANCEIRA ATUAL
 **LUCROS POR CENÁRIO:**
@@ -1142,27 +1388,17 @@ Baseado no contexto completo da partida (minuto {match_context.minute}', placar
         
         return prompt
     
-    def _calculate_azarao_goal_probability(self, stats: MatchStatistics, minute: int) -> float:
-        """Calcula probabilidade estimada do azarão marcar"""
-        base_prob = 35.0
-        
-        # Ajustes baseados em estatísticas
-        if stats.shots_on_target_aza > 0:
-            base_prob += stats.shots_on_target_aza * 8
-        
-        if stats.dangerous_attacks_aza > 5:
-            base_prob += (stats.dangerous_attacks_aza - 5) * 2
-        
-        if stats.corners_aza > 2:
-            base_prob += (stats.corners_aza - 2) * 3
-        
-        # Ajuste temporal
-        if minute > 60:
-            base_prob += 15
-        elif minute > 30:
-            base_prob += 8
-        
-        return min(85.0, base_prob)
+    def _calculate_azarao_goal_probability(self, match_context: MatchContext, minute: Optional[int] = None) -> float:
+        """Probabilidade (%) de o azarão marcar até o fim - posteriori da partida + tabela ao vivo
+
+        Outro minuto (ex.: 45 no intervalo) só consulta a tabela: atualizar com minuto menor reiniciaria a posteriori."""
+        probabilidades = self.protection_system.probabilidades_partida(match_context)
+        if minute is not None and minute != match_context.minute:
+            stats = match_context.statistics
+            probabilidades = self.protection_system.atualizador_taxas.probabilidades(
+                minute, match_context.current_score,
+                int(_estatistica(stats, 'red_cards_fav')), int(_estatistica(stats, 'red_cards_aza')))
+        return probabilidades['gol_azarao'] * 100
     
     def _generate_pre_match_prompt(self, profile: RiskProfile, profits: List[float], odds_values: Dict, action_plan: List[str]) -> str:
         """Gera prompt para análise pré-partida"""
@@ -1222,7 +1458,7 @@ Baseado no contexto completo da partida (minuto {match_context.minute}', placar
 - Finalizações: {stats.shots_aza} ({stats.shots_on_target_aza} no alvo)
 - Ataques Perigosos: {stats.dangerous_attacks_aza}
 - Escanteios: {stats.corners_aza}
-- **Probabilidade Estimada de Gol:** {self._calculate_azarao_goal_probability(stats, match_context.minute):.1f}%
+- **Probabilidade Estimada de Gol:** {self._calculate_azarao_goal_probability(match_context):.1f}%
 
 Analise a oportunidade emergente para Mais 0,5 Gols Azarão considerando o contexto atual.
 """
@@ -1244,7 +1480,7 @@ Analise a oportunidade emergente para Mais 0,5 Gols Azarão considerando o conte
 **Performance do Azarão:**
 - Finalizações: {stats.shots_aza} (No alvo: {stats.shots_on_target_aza})
 - Ataques Perigosos: {stats.dangerous_attacks_aza}
-- **Probabilidade 2º Tempo:** {min(70, self._calculate_azarao_goal_probability(stats, match_context.minute) + 15):.1f}%
+- **Probabilidade 2º Tempo:** {self._calculate_azarao_goal_probability(match_context, 45):.1f}%
 
 Analise o primeiro tempo e forneça previsões para o segundo tempo com FOCO EM MAIS 0,5 GOLS AZARÃO.
 """
@@ -1331,12 +1567,13 @@ class DynamicHedgeManager:
     def __init__(self):
         self.current_hedge_bets: List[HedgeBet] = []
         self.applied_strategy = None
-        self.ia_analyzer = IAAnalyzer()
+        # 🔥 UM SÓ SISTEMA DE PROTEÇÃO: ANALISADOR E GERENCIADOR COMPARTILHAM A POSTERIORI DA PARTIDA
+        self.protection_system = DynamicProtectionSystem()
+        self.ia_analyzer = IAAnalyzer(self.protection_system)
         self.memory_manager = OperationMemoryManager()
         # NOVOS COMPONENTES
         self.minute_analyzer = MinuteOddsAnalyzer()
         self.post_goal_analyzer = PostGoalAnalyzer()
-        self.protection_system = DynamicProtectionSystem()
         self.prompt_generator = IAPromptGenerator()
         self.match_events = []
         
@@ -1346,7 +1583,7 @@ class DynamicHedgeManager:
         """Gera prompt automático de proteção usando a nova função"""
         return gerar_prompt_automatico_protecao(
             zero_profit, fav_profit, aza_profit, odds_values, minute, current_score,
-            statistics, use_analise_conquistador
+            statistics, use_analise_conquistador, self.protection_system.atualizador_taxas
         )
     
     def register_goal_event(self, goal_type: str, minute: int, current_profits: Dict):
@@ -2104,7 +2341,8 @@ def render_enhanced_hedge_controls(zero_profit: float, fav_profit: float, aza_pr
 
 def gerar_prompt_automatico_protecao(zero_profit: float, fav_profit: float, aza_profit: float,
                                    odds_values: Dict, minute: int, current_score: str,
-                                   statistics: Dict, use_analise_conquistador: bool = False) -> str:
+                                   statistics: Dict, use_analise_conquistador: bool = False,
+                                   atualizador: Optional[AtualizadorTaxasAoVivo] = None) -> str:
     """Gera prompt automático de proteção baseado na situação atual"""
     
     # Calcular métricas de risco
@@ -2148,7 +2386,7 @@ def gerar_prompt_automatico_protecao(zero_profit: float, fav_profit: float, aza_
 - **Finalizações:** {statistics.get('shots_aza', 0)}
 - **Finalizações no Alvo:** {statistics.get('shots_on_target_aza', 0)}
 - **Ataques Perigosos:** {statistics.get('dangerous_attacks_aza', 0)}
-- **Probabilidade Estimada de Gol:** {calcular_probabilidade_azarao(statistics, minute):.1f}%
+- **Probabilidade Estimada de Gol:** {calcular_probabilidade_azarao(statistics, minute, current_score, atualizador):.1f}%
 
 ### 🎰 ODDS DISPONÍVEIS
 """
@@ -2203,28 +2441,10 @@ Baseado no contexto acima (minuto {minute}', placar {current_score}, risco {nive
     
     return prompt
 
-def calcular_probabilidade_azarao(statistics: Dict, minute: int) -> float:
-    """Calcula probabilidade estimada do azarão marcar"""
-    base_prob = 35.0
-    
-    # Ajustes baseados em estatísticas
-    shots_aza = statistics.get('shots_aza', 0)
-    shots_on_target_aza = statistics.get('shots_on_target_aza', 0)
-    dangerous_attacks_aza = statistics.get('dangerous_attacks_aza', 0)
-    
-    if shots_on_target_aza > 0:
-        base_prob += shots_on_target_aza * 8
-    
-    if dangerous_attacks_aza > 5:
-        base_prob += (dangerous_attacks_aza - 5) * 2
-    
-    # Ajuste temporal
-    if minute > 60:
-        base_prob += 15
-    elif minute > 30:
-        base_prob += 8
-    
-    return min(85.0, base_prob)
+def calcular_probabilidade_azarao(statistics: Dict, minute: int, current_score: str = "0x0",
+                                  atualizador: Optional[AtualizadorTaxasAoVivo] = None) -> float:
+    """Probabilidade (%) de o azarão marcar até o fim - posteriori da partida (quando informada) + tabela ao vivo"""
+    return probabilidades_ao_vivo(statistics, minute, current_score, atualizador)['gol_azarao'] * 100
 
 def render_hedge_results():
     """Mostra resultados das operações de hedge aplicadas"""
@@ -2356,4 +2576,9 @@ def main_hedge_module():
     render_hedge_controls(zero_profit, fav_profit, aza_profit, {})
 
 if __name__ == "__main__":
-    main_hedge_module()
+    if "--gerar-tabela-ao-vivo" in sys.argv:
+        # Grava a tabela padrão para ser carregada com memory-map nas próximas importações
+        TabelaAoVivo.construir(arredondar_lambda(LAMBDA_PADRAO_FAVORITO), arredondar_lambda(LAMBDA_PADRAO_AZARAO)).salvar()
+        print(f"Tabela ao vivo gravada em {CAMINHO_TABELA_AO_VIVO}")
+    else:
+        main_hedge_module()